@@ -1,28 +1,156 @@
 import discord
 import os
 import asyncio
+import time
+from contextlib import asynccontextmanager
 from discord.ext import commands
 from dotenv import load_dotenv
+from core import config
+from core.backup import backup
+from core.database import Database
+from core.guild_settings import GuildSettingsCache
+from core.metrics import registry
+from core.migrations import migrate
+from core.outbound import Outbound
+from core.owner_filter import OwnerBloom, OwnerSet
+from core.process_ingest import ProcessIngest
+from core.scheduler import Scheduler, every
+from core.store import open_store
+from core.tupper_cache import TupperCache
+from core.xp_buffer import XpBuffer
 
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
 load_dotenv(".env")
 TOKEN: str = os.getenv("TOKEN")
-client = commands.Bot(command_prefix="$", intents=discord.Intents.all())
+intents = discord.Intents.all()
+intents.presences = False  # Never read, and the busiest gateway stream on large servers
+if config.AUTO_SHARD:
+    client = commands.AutoShardedBot(command_prefix="$", intents=intents, shard_count=config.SHARD_COUNT or None)
+else:
+    client = commands.Bot(command_prefix="$", intents=intents)
+if config.INGEST_PROCESSES and config.STORAGE != "sqlite":
+    # The writer process opens DB_PATH itself
+    raise SystemExit("RPXP_INGEST_PROCESSES needs RPXP_STORAGE=sqlite")
+client.db = Database(config.DB_PATH) if config.STORAGE == "sqlite" else None
+client.store = open_store(config.STORAGE, client.db)
+client.tuppers = TupperCache(client.store)
+client.guild_settings = GuildSettingsCache(client.store)
+client.scheduler = Scheduler(client.store)
+client.xp_buffer = XpBuffer(client.store, config.XP_FLUSH_THRESHOLD)
+client.ingest = None
+client.outbound = Outbound(config.OUTBOUND_CHANNEL_LIMIT, config.OUTBOUND_CHANNEL_PERIOD, config.OUTBOUND_GLOBAL_LIMIT)
+
+started = time.perf_counter()
+connecting = None
+
+@asynccontextmanager
+async def phase(name):
+    # Times one startup step; the numbers end up in the log and in metrics
+    phase_started = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - phase_started
+    registry.set("rpxp_startup_phase_seconds", elapsed, phase=name)
+    print(f"Startup: {name} took {elapsed * 1000:.0f} ms")
 
 @client.event
 async def on_ready():
+    global connecting
+    if connecting is not None:
+        elapsed = time.perf_counter() - connecting
+        registry.set("rpxp_startup_phase_seconds", elapsed, phase="gateway")
+        registry.set("rpxp_startup_seconds", time.perf_counter() - started)
+        print(f"Startup: gateway took {elapsed * 1000:.0f} ms, {time.perf_counter() - started:.2f} s in total")
+        connecting = None
     print("Bot has connected to Discord API")
 
 async def load():
-    for filename in os.listdir("./cogs"):
-        if filename.endswith(".py"):
-            await client.load_extension(f"cogs.{filename[:-3]}")
-            print(f"{filename[:-3]} has been loaded")
+    # Extensions load concurrently but are started, and reported, in name
+    # order; a failure stops startup like it did when they loaded one by one
+    names = sorted(filename[:-3] for filename in os.listdir("./cogs") if filename.endswith(".py"))
+    results = await asyncio.gather(*(client.load_extension(f"cogs.{name}") for name in names), return_exceptions=True)
+    for name, result in zip(names, results):
+        if isinstance(result, BaseException):
+            print(f"{name} failed to load: {result}")
+        else:
+            print(f"{name} has been loaded")
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+async def warm_caches():
+    if config.OWNER_FILTER == "bloom":
+        owners = OwnerBloom(config.OWNER_FILTER_CAPACITY, config.OWNER_FILTER_ERROR_RATE)
+    else:
+        owners = OwnerSet()
+    guilds, tupper_owners = await asyncio.gather(client.guild_settings.warm(), client.tuppers.warm(owners))
+    print(f"Cached {guilds} servers and {tupper_owners} tupper owners")
+
+async def compact_xp_events():
+    before = int(time.time()) - config.XP_EVENTS_RETENTION_DAYS * 24 * 60 * 60
+    folded = await client.store.compact_xp_events(before)
+    if folded:
+        print(f"Folded {folded} xp events into daily snapshots")
+
+async def backup_database():
+    # Pending XP goes in first so the backup is as fresh as the database
+    await client.xp_buffer.flush()
+    path, raw_size, size, elapsed = await backup(
+        config.DB_PATH, config.BACKUP_DIR, config.BACKUP_KEEP, config.BACKUP_PAGES, config.BACKUP_STEP_PAUSE
+    )
+    print(f"Backed up {raw_size / 1024:.0f} KiB to {path} ({size / 1024:.0f} KiB) in {elapsed:.2f} s")
+
+def start_ingest_processes():
+    # The writer process holds pending XP from here on, so it takes over
+    # client.xp_buffer: flushing means waiting for the writer
+    client.ingest = client.xp_buffer = ProcessIngest(
+        config.DB_PATH, config.INGEST_PROCESSES, config.INGEST_QUEUE_SIZE,
+        config.XP_FLUSH_INTERVAL, config.XP_FLUSH_THRESHOLD
+    )
+    client.tuppers.listeners.append(client.ingest.invalidate_tuppers)
+    client.guild_settings.listeners.append(client.ingest.invalidate_guild)
+    client.ingest.start()
+    print(f"Started {config.INGEST_PROCESSES} parser processes and a writer process")
 
 async def main():
+    global connecting
     async with client:
-        await load()
-        await client.start(TOKEN)
+        if client.db is not None:
+            async with phase("migrations"):
+                await client.db.transaction(migrate)
+        async with phase("cache warm-up"):
+            await warm_caches()
+        if config.INGEST_PROCESSES:
+            async with phase("ingest processes"):
+                start_ingest_processes()
+        async with phase("scheduler"):
+            await client.scheduler.add("xp_compaction", compact_xp_events, every(config.XP_COMPACT_INTERVAL))
+            if client.db is not None:
+                await client.scheduler.add("db_maintenance", client.db.optimize, every(24 * 60 * 60))
+                if config.BACKUP_INTERVAL:
+                    await client.scheduler.add("db_backup", backup_database, every(config.BACKUP_INTERVAL))
+            client.scheduler.start()
+        async with phase("extensions"):
+            await load()
+        try:
+            async with phase("login"):
+                await client.login(TOKEN)
+            connecting = time.perf_counter()
+            if config.AUTO_SHARD:
+                print(f"Connecting with {config.SHARD_COUNT or 'the recommended number of'} shards")
+            await client.connect()
+        finally:
+            left = await client.outbound.drain(5)
+            if left:
+                print(f"Dropped {left} queued replies and deletes on shutdown")
+            await client.scheduler.stop()
+            await client.xp_buffer.flush()
+            if client.ingest is not None:
+                await client.ingest.stop()
+            if client.db is not None:
+                client.db.close()
 
-asyncio.run(main())
\ No newline at end of file
+# Ingest processes are spawned and import this module again; only the
+# original process may start the bot
+if __name__ == "__main__":
+    asyncio.run(main())
\ No newline at end of file
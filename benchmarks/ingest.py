@@ -0,0 +1,223 @@
+"""Offline throughput benchmark for the message ingestion path.
+
+    python -m benchmarks.ingest --tuppers 100000 --messages 20000 --output bench.json
+
+Builds a throwaway database with the requested number of guilds, users and
+tuppers, then feeds fake discord messages through Counter.on_message ->
+shard queues -> process_message without connecting to Discord. Reports
+throughput, p50/p99 processing latency and queue lag, and writes them as
+JSON together with the current commit so runs can be compared.
+"""
+import argparse
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import tempfile
+import time
+import types
+
+from core import config
+from core.database import Database
+from core.guild_settings import GuildSettingsCache
+from core.migrations import migrate
+from core.owner_filter import OwnerSet
+from core.process_ingest import ProcessIngest
+from core.scheduler import Scheduler
+from core.store import STORES, open_store
+from core.tupper_cache import TupperCache
+from core.xp_buffer import XpBuffer
+from cogs.rpxp_calculator import Counter
+
+GUILD_BASE = 10 ** 17
+USER_BASE = 2 * 10 ** 17
+MESSAGE_IDS = itertools.count(3 * 10 ** 17)
+WORDS = "the quick brown fox jumps over a lazy dog while bards sing of old heroes".split()
+
+
+def build_database(path, guilds, users, tuppers, seed):
+    rng = random.Random(seed)
+    connection = sqlite3.connect(path)
+    migrate(connection.cursor())
+
+    with connection:
+        connection.executemany(
+            "INSERT INTO Guilds (guild_id, staff_role, rpxp_channel, cooldown, xppw, level_falloff) VALUES (?, 1, 1, 28800, 0.02, 5)",
+            [(GUILD_BASE + g,) for g in range(guilds)]
+        )
+        connection.executemany(
+            "INSERT INTO Users (guild_id, user_id, monthly_messages, monthly_rpxp, total_messages, total_rpxp) VALUES (?, ?, 0, 0, 0, 0)",
+            ((GUILD_BASE + u % guilds, USER_BASE + u) for u in range(users))
+        )
+        connection.executemany(
+            "INSERT INTO Tuppers (guild_id, owner_id, tupper_tag, tupper_name, tupper_role, tupper_level, tupper_rpxp) VALUES (?, ?, ?, ?, ?, ?, 0)",
+            ((GUILD_BASE + (t % users) % guilds, USER_BASE + t % users, f"t{t}:", f"Tupper {t}", 1, rng.randint(3, 19))
+             for t in range(tuppers))
+        )
+    connection.close()
+
+
+def fake_message(guild_id, author_id, content):
+    return types.SimpleNamespace(
+        id=next(MESSAGE_IDS),
+        content=content,
+        guild=types.SimpleNamespace(id=guild_id, shard_id=0),
+        author=types.SimpleNamespace(id=author_id, bot=False),
+    )
+
+
+def make_messages(count, guilds, users, tuppers, rp_ratio, seed):
+    rng = random.Random(seed)
+    messages = []
+    for _ in range(count):
+        body = " ".join(rng.choices(WORDS, k=rng.randint(5, 300)))
+        if rng.random() < rp_ratio:
+            t = rng.randrange(tuppers)
+            user = t % users
+            messages.append(fake_message(GUILD_BASE + user % guilds, USER_BASE + user, f"t{t}: {body}"))
+        else:
+            user = rng.randrange(users)
+            messages.append(fake_message(GUILD_BASE + user % guilds, USER_BASE + user, body))
+    return messages
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class BenchCounter(Counter):
+    # Records enqueue -> dequeue lag and processing time for every message
+    def __init__(self, client):
+        super().__init__(client)
+        self.latencies = []
+        self.lags = []
+
+    async def process_message(self, record, queue=None):
+        started = time.perf_counter()
+        self.lags.append(time.time() - record.timestamp)
+        await super().process_message(record, queue)
+        self.latencies.append(time.perf_counter() - started)
+
+
+async def run(args, path):
+    db = Database(path)
+    client = types.SimpleNamespace(db=db)
+    client.store = open_store(args.storage, db)
+    if args.storage == "memory":
+        # Same data, but every read and write stays in this process
+        connection = sqlite3.connect(path)
+        client.store.load(connection.cursor())
+        connection.close()
+    client.tuppers = TupperCache(client.store)
+    await client.tuppers.warm(OwnerSet())
+    client.guild_settings = GuildSettingsCache(client.store)
+    client.xp_buffer = XpBuffer(client.store, args.flush_threshold)
+    if args.processes:
+        client.ingest = client.xp_buffer = ProcessIngest(path, args.processes, args.queue_size, config.XP_FLUSH_INTERVAL, args.flush_threshold)
+        client.ingest.start()
+    client.scheduler = Scheduler(client.store)
+    client.scheduler.start()
+
+    config.INGEST_QUEUE_SIZE = args.queue_size
+    config.INGEST_OVERFLOW = args.overflow
+    config.INGEST_SPILL_PATH = os.path.join(os.path.dirname(path), "spill")
+    counter = BenchCounter(client)
+    await counter.cog_load()
+    messages = make_messages(args.messages, args.guilds, args.users, args.tuppers, args.rp_ratio, args.seed)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        await counter.on_ready()
+        started = time.perf_counter()
+        for message in messages:
+            await counter.on_message(message)
+            if args.rate:
+                await asyncio.sleep(1 / args.rate)
+        for queue in counter.input_queues:
+            await queue.join()
+        await client.xp_buffer.flush()
+        elapsed = time.perf_counter() - started
+        counter.cog_unload()
+        if args.processes:
+            await client.ingest.stop()
+        await client.scheduler.stop()
+
+    db_stats = db.stats()
+    db.close()
+
+    return {
+        "messages": len(messages),
+        "seconds": elapsed,
+        "messages_per_second": len(messages) / elapsed if elapsed else 0.0,
+        "latency_p50_ms": percentile(counter.latencies, 0.50) * 1000,
+        "latency_p99_ms": percentile(counter.latencies, 0.99) * 1000,
+        "queue_lag_p50_ms": percentile(counter.lags, 0.50) * 1000,
+        "queue_lag_p99_ms": percentile(counter.lags, 0.99) * 1000,
+        "queue_lag_max_ms": max(counter.lags, default=0.0) * 1000,
+        "coalesced": counter.coalesced,
+        "dropped": sum(queue.dropped for queue in counter.input_queues),
+        "spilled": sum(queue.spilled for queue in counter.input_queues),
+        "db": db_stats,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the RP message ingestion path without Discord.")
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--tuppers", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--rp-ratio", type=float, default=0.3, help="fraction of messages that carry a tag")
+    parser.add_argument("--rate", type=float, default=0, help="messages per second to offer (0 sends one burst)")
+    parser.add_argument("--flush-threshold", type=int, default=200)
+    parser.add_argument("--queue-size", type=int, default=config.INGEST_QUEUE_SIZE, help="per-shard queue bound (0 for unbounded)")
+    parser.add_argument("--overflow", choices=["block", "drop", "spill"], default=config.INGEST_OVERFLOW)
+    parser.add_argument("--processes", type=int, default=0, help="parser processes (0 scores in the benchmark process)")
+    parser.add_argument("--storage", choices=STORES, default="sqlite")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args(argv)
+    if args.processes and args.storage != "sqlite":
+        parser.error("--processes needs --storage sqlite")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "bench.db")
+        build_started = time.perf_counter()
+        build_database(path, args.guilds, args.users, args.tuppers, args.seed)
+        build_seconds = time.perf_counter() - build_started
+        results = asyncio.run(run(args, path))
+
+    report = {
+        "commit": git_commit(),
+        "params": vars(args),
+        "build_seconds": build_seconds,
+        "results": results,
+    }
+
+    print(
+        f"{results['messages']} messages in {results['seconds']:.2f}s "
+        f"({results['messages_per_second']:.0f} msg/s), "
+        f"latency p50 {results['latency_p50_ms']:.3f} ms / p99 {results['latency_p99_ms']:.3f} ms, "
+        f"queue lag p99 {results['queue_lag_p99_ms']:.1f} ms, "
+        f"{results['coalesced']} coalesced, {results['dropped']} dropped, {results['spilled']} spilled"
+    )
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump(report, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Micro-benchmarks for core.wordcount on long roleplay posts.
+
+    python -m benchmarks.wordcount --output wordcount.json
+
+Times the word counter for every rule set on generated posts just under
+Discord's 2000 character message limit and 4000 character Nitro limit,
+next to plain str.split and a streaming re.finditer scan for reference.
+"""
+import argparse
+import json
+import random
+import re
+import timeit
+
+from benchmarks.ingest import WORDS, git_commit
+from core.wordcount import RULES, counter_for
+
+EXTRAS = [
+    "((brb, dinner))", "https://example.com/some/long/path?x=1", "<@123456789012345678>",
+    "*draws her sword*", "---", "<:smile:123456789012345678>", "`/roll 1d20`",
+]
+
+_WORD = re.compile(r"\S+")
+
+
+def make_post(length, seed):
+    rng = random.Random(seed)
+    lines = ["> what they said last time"]
+    line = []
+    while sum(len(part) + 1 for part in lines) < length:
+        line.append(rng.choice(EXTRAS) if rng.random() < 0.05 else rng.choice(WORDS))
+        if len(line) > 15:
+            lines.append(" ".join(line))
+            line = []
+    return "\n".join(lines)[:length]
+
+
+def streaming(text):
+    return sum(1 for _ in _WORD.finditer(text))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark word counting on long posts.")
+    parser.add_argument("--number", type=int, default=2000, help="calls per timing run")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results to this JSON file")
+    args = parser.parse_args(argv)
+
+    cases = {"str.split": lambda text: len(text.split()), "finditer": streaming}
+    cases.update((f"rules={name}", counter_for(frozenset([name]))) for name in RULES)
+    cases["rules=all"] = counter_for(frozenset(RULES))
+
+    results = []
+    for length in (1990, 3990):
+        post = make_post(length, args.seed)
+        for name, count in cases.items():
+            best = min(timeit.repeat(lambda: count(post), number=args.number, repeat=args.repeat)) / args.number
+            results.append({"chars": length, "case": name, "words": count(post), "microseconds": best * 1e6})
+            print(f"{length:>5} chars  {name:<16} {count(post):>4} words  {best * 1e6:8.2f} us")
+
+    if args.output:
+        with open(args.output, "w") as handle:
+            json.dump({"commit": git_commit(), "params": vars(args), "results": results}, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
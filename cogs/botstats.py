@@ -0,0 +1,145 @@
+import discord
+from discord.ext import commands, tasks
+import asyncio
+import time
+from core import config
+from core.metrics import registry
+
+class BotStats(commands.Cog):
+    def __init__(self, client):
+        self.client = client
+        self.server = None
+        registry.register_collector("runtime", self.runtime_gauges)
+
+    async def cog_load(self):
+        if config.METRICS_PORT:
+            self.server = await registry.serve(config.METRICS_HOST, config.METRICS_PORT)
+            print(f"Metrics available on http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+        if config.METRICS_FILE:
+            self.export_file.change_interval(seconds=config.METRICS_FILE_INTERVAL)
+            self.export_file.start()
+
+    async def cog_unload(self):
+        registry.unregister_collector("runtime")
+        self.export_file.cancel()
+        if self.server:
+            self.server.close()
+
+    def runtime_gauges(self):
+        db = self.client.db.stats() if self.client.db is not None else {}
+        gauges = [(f"rpxp_db_{key}", {}, value) for key, value in db.items()]
+        gauges += [
+            ("rpxp_xp_buffer_pending_messages", {}, self.client.xp_buffer.pending),
+            ("rpxp_xp_buffer_flushes", {}, self.client.xp_buffer.flushes),
+            ("rpxp_tupper_cache_owners", {}, len(self.client.tuppers)),
+            ("rpxp_guild_cache_guilds", {}, len(self.client.guild_settings)),
+            ("rpxp_uptime_seconds", {}, time.time() - registry.started),
+        ]
+        if isinstance(self.client, commands.AutoShardedBot):
+            for shard_id, latency in self.client.latencies:
+                gauges.append(("rpxp_gateway_latency_seconds", {"gateway_shard": shard_id}, latency))
+            for shard_id, guilds in self.guilds_per_shard().items():
+                gauges.append(("rpxp_gateway_shard_guilds", {"gateway_shard": shard_id}, guilds))
+        elif self.client.is_ready():
+            gauges.append(("rpxp_gateway_latency_seconds", {}, self.client.latency))
+        return gauges
+
+    def guilds_per_shard(self):
+        counts = {}
+        for guild in self.client.guilds:
+            counts[guild.shard_id] = counts.get(guild.shard_id, 0) + 1
+        return counts
+
+    @commands.Cog.listener()
+    async def on_shard_connect(self, shard_id):
+        registry.inc("rpxp_gateway_shard_events_total", gateway_shard=shard_id, event="connect")
+
+    @commands.Cog.listener()
+    async def on_shard_disconnect(self, shard_id):
+        registry.inc("rpxp_gateway_shard_events_total", gateway_shard=shard_id, event="disconnect")
+
+    @commands.Cog.listener()
+    async def on_shard_resumed(self, shard_id):
+        registry.inc("rpxp_gateway_shard_events_total", gateway_shard=shard_id, event="resume")
+
+    @tasks.loop(seconds=15)
+    async def export_file(self):
+        try:
+            await asyncio.to_thread(registry.write_file, config.METRICS_FILE)
+        except Exception as e:
+            print(f"Error writing metrics file: {e}")
+
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def botstats(self, ctx):
+        try:
+            self.client.outbound.delete(ctx.message)
+            if ctx.author.bot:
+                return
+
+            gauges = {name: value for (name, labels), value in registry.collect().items() if not labels}
+            counter = self.client.get_cog("Counter")
+            shards = counter.shard_stats() if counter else []
+
+            ingest = "\n".join(
+                f"- Shard {shard['shard']}: **{shard['depth']}** queued, {shard['processed']} processed, "
+                f"{shard['dropped']} dropped, {shard['spilled']} spilled"
+                for shard in shards
+            )
+            if isinstance(self.client, commands.AutoShardedBot):
+                guilds = self.guilds_per_shard()
+                gateway = "\n".join(
+                    f"- Shard {shard_id}: {guilds.get(shard_id, 0)} servers, latency **{latency * 1000:.0f} ms**"
+                    for shard_id, latency in self.client.latencies
+                )
+            else:
+                gateway = f"- Not sharded, latency **{self.client.latency * 1000:.0f} ms**"
+            command_queue = sum(value for (name, labels), value in registry.collect().items() if name == "rpxp_command_queue_depth")
+            if counter:
+                ingest += f"\n- {counter.coalesced} messages coalesced into earlier updates"
+            histograms = registry.histogram_snapshot()
+            ingest_wait = histograms.get(("rpxp_ingest_queue_wait_seconds", ()))
+            if ingest_wait:
+                ingest += f"\n- Queue wait p50 **{ingest_wait.quantile(0.5) * 1000:g} ms**, p99 **{ingest_wait.quantile(0.99) * 1000:g} ms**"
+
+            database = (
+                f"- {gauges.get('rpxp_db_connections', 0)} connections, "
+                f"{gauges.get('rpxp_db_pending_reads', 0)} reads / {gauges.get('rpxp_db_pending_writes', 0)} writes pending\n"
+                f"- {gauges.get('rpxp_db_completed_reads', 0)} reads, {gauges.get('rpxp_db_completed_writes', 0)} writes, {gauges.get('rpxp_db_errors', 0)} errors\n"
+                f"- XP buffer: **{gauges.get('rpxp_xp_buffer_pending_messages', 0)}** messages pending, {gauges.get('rpxp_xp_buffer_flushes', 0)} flushes"
+            )
+            last_backup = gauges.get("rpxp_backup_last_success_timestamp")
+            if last_backup:
+                backup_bytes = {dict(labels)["kind"]: value for (name, labels), value in registry.collect().items() if name == "rpxp_backup_bytes"}
+                database += (
+                    f"\n- Last backup <t:{int(last_backup)}:R>: {backup_bytes.get('compressed', 0) / 1024:.0f} KiB "
+                    f"in {gauges.get('rpxp_backup_seconds', 0):.1f} s"
+                )
+
+            latencies = []
+            for (name, labels), histogram in sorted(histograms.items()):
+                if name == "rpxp_command_seconds":
+                    latencies.append(f"- `{self.client.command_prefix}{dict(labels)['command']}`: {histogram.count}x, p50 **{histogram.quantile(0.5) * 1000:g} ms**, p99 **{histogram.quantile(0.99) * 1000:g} ms**")
+
+            embed_message = discord.Embed(title="Bot statistics", color=discord.Color.purple())
+            embed_message.add_field(name="Message ingestion", value=ingest[:1024] or "(No workers running)", inline=False)
+            embed_message.add_field(name="Gateway", value=gateway[:1024], inline=False)
+            embed_message.add_field(name="Command queue", value=(
+                f"**{command_queue}** commands waiting\n"
+                f"- Outbound: **{gauges.get('rpxp_outbound_queue_depth', 0)}** replies and deletes queued, "
+                f"{gauges.get('rpxp_outbound_embeds_merged', 0)} embeds merged into earlier replies"
+            ), inline=False)
+            embed_message.add_field(name="Database", value=database, inline=False)
+            embed_message.add_field(name="Command latency", value="\n".join(latencies[:15]) or "(No commands run yet)", inline=False)
+            embed_message.set_footer(text=f"Up for {int(gauges.get('rpxp_uptime_seconds', 0)) // 60} minutes")
+
+            self.client.outbound.send(ctx.channel, embed_message, key=ctx.message.id)
+        except Exception as e:
+            print(f"Command Error in {ctx.command.name}: {e}")
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        print("botstats.py is ready")
+
+async def setup(client):
+    await client.add_cog(BotStats(client))
@@ -1,9 +1,11 @@
 import discord
-import sqlite3
-from discord.ext import commands, tasks
-import datetime
-from datetime import timezone
+from discord.ext import commands
 import asyncio
+import time
+from core import config
+from core.leaderboard import Leaderboard
+from core.wordcount import RULES, format_rules, parse_rules
+from core.metrics import registry
 
 def skip_incomplete_setup_block():
     def decorator(func):
@@ -11,64 +13,89 @@ def skip_incomplete_setup_block():
         return func
     return decorator
 
+class CommandShard:
+    # Command queue, worker and leaderboard cache for the guilds of one
+    # gateway shard. Without gateway sharding there is only shard 0.
+    def __init__(self, cog, shard):
+        self.queue = asyncio.Queue()
+        self.leaderboard = Leaderboard(cog.store, config.LEADERBOARD_PAGE_SIZE, config.LEADERBOARD_CACHE_SECONDS)
+        self.worker = asyncio.create_task(cog.db_worker(self.queue))
+
 class Commands(commands.Cog):
     def __init__(self, client):
         self.client = client
-        self.time = 0
         self.prefix = "$"
-        self.db_queue = asyncio.Queue()
-        self.client.loop.create_task(self.db_worker())
+        self.store = client.store
+        self.tuppers = client.tuppers
+        self.xp_buffer = client.xp_buffer
+        self.guilds = client.guild_settings
+        self.outbound = client.outbound
+        self.sharded = isinstance(client, commands.AutoShardedBot)
+        self.shards = {}
+        registry.register_collector("commands", self.queue_gauges)
+
+    def cog_unload(self):
+        registry.unregister_collector("commands")
+        for shard in self.shards.values():
+            shard.worker.cancel()
+
+    def shard(self, guild):
+        shard = self.shards.get(guild.shard_id)
+        if shard is None:
+            shard = self.shards[guild.shard_id] = CommandShard(self, guild.shard_id)
+        return shard
+
+    def queue_gauges(self):
+        if not self.sharded:
+            return [("rpxp_command_queue_depth", {}, sum(shard.queue.qsize() for shard in self.shards.values()))]
+        return [("rpxp_command_queue_depth", {"gateway_shard": shard_id}, shard.queue.qsize()) for shard_id, shard in self.shards.items()]
 
     async def send_embed(self, ctx, title, description, color):
         embed = discord.Embed(title=title, description=description, color=color)
-        await ctx.send(embed=embed)
+        await self.reply(ctx, embed)
+
+    async def reply(self, ctx, embed):
+        # Queued, not sent: embeds from one invocation go out as one message
+        self.outbound.send(ctx.channel, embed, key=ctx.message.id)
 
     async def pre_command_checks(self, ctx, task_func, *task_args):
-        await ctx.message.delete()
+        self.outbound.delete(ctx.message)
         if ctx.author.bot:
             return
-    
-        connection = None
+
+        # Registration notices and the command's reply are sent together
+        # once the command has run (see db_worker)
+        self.outbound.hold(ctx.message.id)
+        queued = False
+        try:
+            queued = await self._pre_command_checks(ctx, task_func, task_args)
+        finally:
+            if not queued:
+                self.outbound.release(ctx.message.id)
+
+    async def _pre_command_checks(self, ctx, task_func, task_args):
         try:
-            connection = sqlite3.connect("./RPXP_databank.db")
-            cursor = connection.cursor()
             guild_id = ctx.guild.id
     
-            cursor.execute("SELECT * FROM Guilds WHERE guild_id = ?", (guild_id,))
-            guild_result = cursor.fetchone()
+            guild_result = await self.guilds.get(guild_id)
     
-            cursor.execute("SELECT * FROM Users WHERE guild_id = ? AND user_id = ?", (guild_id, ctx.author.id))
-            user = cursor.fetchone()
-            if user is None:
-                cursor.execute(
-                    "INSERT INTO Users (guild_id, user_id, monthly_messages, monthly_rpxp, total_messages, total_rpxp) VALUES (?, ?, ?, ?, ?, ?)", 
-                    (guild_id, ctx.author.id, 0, 0, 0, 0)
-                )
+            if not await self.store.has_user(guild_id, ctx.author.id):
+                await self.store.register_user(guild_id, ctx.author.id)
                 await self.send_embed(ctx, "User registered", f"{ctx.author.display_name} added to database.", discord.Color.purple())
     
             if guild_result is None:
-                cursor.execute(
-                    "INSERT INTO Guilds (guild_id, xppw, cooldown, level_falloff) VALUES (?, ?, ?, ?)",
-                    (guild_id, 0.02, 28800, 5)
-                )
-                connection.commit()  # Commit early to save the new guild
+                await self.store.register_guild(guild_id)
     
                 await self.send_embed(ctx, "Server registered.", "Server added to database with default settings.", discord.Color.purple())
     
-                cursor.execute("SELECT * FROM Guilds WHERE guild_id = ?", (guild_id,))
-                guild_result = cursor.fetchone()
-    
-            connection.commit()  # Commit user insert if any
+                guild_result = await self.guilds.load(guild_id)
     
-            guild_staff_role = guild_result[1]
-            guild_log_channel = guild_result[2]
+            guild_staff_role = guild_result.staff_role
+            guild_log_channel = guild_result.rpxp_channel
     
         except Exception as e:
             print(f"DB error in pre_command_checks: {e}")
             return
-        finally:
-            if connection:
-                connection.close()
     
         skip_block = getattr(task_func, "_skip_incomplete_setup_block", False)
     
@@ -77,16 +104,24 @@ class Commands(commands.Cog):
             return
     
         # Pass to the command logic task
-        await self.db_queue.put((task_func, (ctx, guild_result, *task_args)))
+        await self.shard(ctx.guild).queue.put((task_func, (ctx, guild_result, *task_args), time.perf_counter()))
+        return True
     
-    async def db_worker(self):
+
+    async def db_worker(self, queue):
         while True:
-            func, args = await self.db_queue.get()
+            func, args, enqueued_at = await queue.get()
+            name = args[0].command.name if args[0].command else func.__name__
+            started = time.perf_counter()
+            registry.observe("rpxp_command_queue_wait_seconds", started - enqueued_at, command=name)
             try:
                 await func(*args)
             except Exception as e:
                 print(f"DB Task Error: {e}")
-            self.db_queue.task_done()
+            finally:
+                self.outbound.release(args[0].message.id)
+            registry.observe("rpxp_command_seconds", time.perf_counter() - started, command=name)
+            queue.task_done()
     
     @commands.command()
     async def boop(self, ctx):
@@ -107,11 +142,11 @@ class Commands(commands.Cog):
     @skip_incomplete_setup_block()
     async def _settings_task(self, ctx, guild_result):
         try:
-            staff_role_id = guild_result[1]
-            log_channel_id = guild_result[2]
-            cooldown = guild_result[3]
-            xppw = guild_result[4]
-            falloff = guild_result[5]
+            staff_role_id = guild_result.staff_role
+            log_channel_id = guild_result.rpxp_channel
+            cooldown = guild_result.cooldown
+            xppw = guild_result.xppw
+            falloff = guild_result.level_falloff
     
             # Handle staff role
             if staff_role_id:
@@ -148,6 +183,9 @@ class Commands(commands.Cog):
     
             # Falloff
             falloff_text = f"{falloff}%" if falloff else "(Not set)"
+
+            # Word counting rules
+            rules_text = ", ".join(sorted(parse_rules(guild_result.word_rules))) or "none"
     
             message = (
                 f"Current server settings:\n"
@@ -155,37 +193,31 @@ class Commands(commands.Cog):
                 f"- **{log_channel_mention}** is the log channel.\n"
                 f"- The collection cooldown lasts for **{time_text}**.\n"
                 f"- Players at level 3 gain **{xp_text}** per word roleplayed.\n"
-                f"- RP XP becomes **{falloff_text}** less effective for every level beyond third."
+                f"- RP XP becomes **{falloff_text}** less effective for every level beyond third.\n"
+                f"- Left out of word counts: **{rules_text}**."
             )
     
             embed_message = discord.Embed(title="Server settings", description=message, color=discord.Color.purple())
             if ctx.guild.icon:
                 embed_message.set_thumbnail(url=ctx.guild.icon.url)
     
-            await ctx.send(embed=embed_message)
+            await self.reply(ctx, embed_message)
     
         except Exception as e:
             print(f"Command Error in {ctx.command.name}: {e}")
 
     @commands.command()
     async def wipe_server(self, ctx):
-        connection = sqlite3.connect("./RPXP_databank.db")
-        cursor = connection.cursor()
-    
-        cursor.execute("DELETE FROM Guilds WHERE guild_id = ?", (ctx.guild.id,))
-        connection.commit()
-        connection.close()
+        await self.store.delete_guild(ctx.guild.id)
+        self.guilds.evict(ctx.guild.id)
     
         await self.send_embed(ctx, "Server data deleted.", "Server data wiped from the database.", discord.Color.red())
 
     @commands.command()
     async def wipe_user(self, ctx):
-        connection = sqlite3.connect("./RPXP_databank.db")
-        cursor = connection.cursor()
-    
-        cursor.execute("DELETE FROM Users WHERE guild_id = ? AND user_id = ?", (ctx.guild.id, ctx.author.id))
-        connection.commit()
-        connection.close()
+        await self.xp_buffer.flush()
+        await self.store.wipe_user(ctx.guild.id, ctx.author.id)
+        self.shard(ctx.guild).leaderboard.invalidate(ctx.guild.id)
     
         await self.send_embed(ctx, "User data deleted.", "User data wiped from the database for this server.", discord.Color.red())
 
@@ -210,10 +242,8 @@ class Commands(commands.Cog):
                 return
     
             # Role exists, update database
-            with sqlite3.connect("./RPXP_databank.db") as connection:
-                cursor = connection.cursor()
-                cursor.execute("UPDATE Guilds SET staff_role = ? WHERE guild_id = ?", (role_id, ctx.guild.id))
-                connection.commit()
+            await self.store.update_guild(ctx.guild.id, staff_role=role_id)
+            self.guilds.update(ctx.guild.id, staff_role=role_id)
     
             await self.send_embed(ctx, "Staff role saved.", f"Staff role set to {role.mention}", discord.Color.purple())
     
@@ -241,10 +271,8 @@ class Commands(commands.Cog):
                 return
     
             # Channel exists, update database
-            with sqlite3.connect("./RPXP_databank.db") as connection:
-                cursor = connection.cursor()
-                cursor.execute("UPDATE Guilds SET rpxp_channel = ? WHERE guild_id = ?", (channel_id, ctx.guild.id))
-                connection.commit()
+            await self.store.update_guild(ctx.guild.id, rpxp_channel=channel_id)
+            self.guilds.update(ctx.guild.id, rpxp_channel=channel_id)
     
             await self.send_embed(ctx, "Log channel saved.", f"Log channel set to {channel.mention}", discord.Color.purple())
     
@@ -279,10 +307,8 @@ class Commands(commands.Cog):
                 time_text = f"{days} day{'s' if days != 1 else ''}"
     
             # Update the database safely
-            with sqlite3.connect("./RPXP_databank.db") as connection:
-                cursor = connection.cursor()
-                cursor.execute("UPDATE Guilds SET cooldown = ? WHERE guild_id = ?", (cooldown, ctx.guild.id))
-                connection.commit()
+            await self.store.update_guild(ctx.guild.id, cooldown=cooldown)
+            self.guilds.update(ctx.guild.id, cooldown=cooldown)
     
             await self.send_embed(ctx, "Cooldown saved.", f"RP XP collection cooldown set to {time_text}.", discord.Color.purple())
     
@@ -303,16 +329,40 @@ class Commands(commands.Cog):
             return
     
         try:
-            with sqlite3.connect("./RPXP_databank.db") as connection:
-                cursor = connection.cursor()
-                guild_id = ctx.guild.id
-                cursor.execute("UPDATE Guilds SET xppw = ? WHERE guild_id = ?", (xppw, guild_id))
-                connection.commit()
+            await self.store.update_guild(ctx.guild.id, xppw=xppw)
+            self.guilds.update(ctx.guild.id, xppw=xppw)
     
             await self.send_embed(ctx, "Xp per word set.", f"Players now gain **{xppw} xp** per word at level 3.", discord.Color.purple())
         except Exception as e:
             print(f"Command Error in {ctx.command.name}: {e}")
 
+    @commands.command()
+    @commands.has_permissions(administrator=True)
+    async def word_rules(self, ctx, *, rules: str = ""):
+        await self.pre_command_checks(ctx, self._word_rules_task, rules)
+
+    @skip_incomplete_setup_block()
+    async def _word_rules_task(self, ctx, guild_result, rules):
+        try:
+            parsed = parse_rules(rules)
+        except ValueError as e:
+            await self.send_embed(ctx, "Invalid input!", f"{e}. Available rules: {', '.join(RULES)}, or `none`.", discord.Color.red())
+            return
+
+        if not rules.strip():
+            await self.send_embed(ctx, "Invalid input!", f"Name the rules to use: {', '.join(RULES)}, or `none` to count every word.", discord.Color.red())
+            return
+
+        try:
+            word_rules = format_rules(parsed) or None
+            await self.store.update_guild(ctx.guild.id, word_rules=word_rules)
+            self.guilds.update(ctx.guild.id, word_rules=word_rules)
+
+            description = f"Word counts now leave out: **{', '.join(sorted(parsed))}**." if parsed else "Every word is counted again."
+            await self.send_embed(ctx, "Word counting rules set.", description, discord.Color.purple())
+        except Exception as e:
+            print(f"Command Error in {ctx.command.name}: {e}")
+
     @commands.command()
     @commands.has_permissions(administrator=True)
     async def level_falloff(self, ctx, falloff: str):
@@ -327,11 +377,8 @@ class Commands(commands.Cog):
             return
     
         try:
-            with sqlite3.connect("./RPXP_databank.db") as connection:
-                cursor = connection.cursor()
-                guild_id = ctx.guild.id
-                cursor.execute("UPDATE Guilds SET level_falloff = ? WHERE guild_id = ?", (falloff, guild_id))
-                connection.commit()
+            await self.store.update_guild(ctx.guild.id, level_falloff=falloff)
+            self.guilds.update(ctx.guild.id, level_falloff=falloff)
     
             await self.send_embed(ctx, "Level falloff set.", f"Rp xp is **{falloff}%** less effective per level gained.", discord.Color.purple())
         except Exception as e:
@@ -343,24 +390,18 @@ class Commands(commands.Cog):
 
     async def _register_task(self, ctx, guild_result, content):
         try:
-            guild_id = guild_result[0]
-    
-            connection = sqlite3.connect("./RPXP_databank.db")
-            cursor = connection.cursor()
+            guild_id = guild_result.guild_id
     
-            staff_role = guild_result[1]
+            staff_role = guild_result.staff_role
     
             # Get user's PCs
-            cursor.execute(
-                "SELECT * FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_role = ?", 
-                (guild_id, ctx.author.id, 1)
-            )
-            tupper_results = cursor.fetchall()
+            owner = await self.store.get_owner_tuppers(guild_id, ctx.author.id)
+            pcs = [tupper for tupper in owner.tuppers if tupper.role == 1]
     
-            pc_amount = len(tupper_results)
+            pc_amount = len(pcs)
             pc_allowance = 2
     
-            if any(row[5] >= 10 for row in tupper_results):
+            if any(tupper.level >= 10 for tupper in pcs):
                 pc_allowance += 1
     
             if any(role.id == staff_role for role in ctx.author.roles):
@@ -371,7 +412,6 @@ class Commands(commands.Cog):
             # Step 1: Get the tag
             if ' ' not in content:
                 await self.send_embed(ctx, "Invalid input!", "Missing character name.", discord.Color.red())
-                connection.close()
                 return
     
             tag, rest = content.split(' ', 1)
@@ -379,34 +419,26 @@ class Commands(commands.Cog):
             # Step 2: Get the character name in square brackets
             if not rest.startswith('['):
                 await self.send_embed(ctx, "Invalid input!", "Character name must be in square brackets.", discord.Color.red())
-                connection.close()
                 return
     
             end_bracket_index = rest.find(']')
             if end_bracket_index == -1:
                 await self.send_embed(ctx, "Invalid input!", "Closing bracket for character name is missing.", discord.Color.red())
-                connection.close()
                 return
     
             name = rest[1:end_bracket_index]
             rest = rest[end_bracket_index + 1:].strip()
     
             # Check if tag is unique or name matches
-            cursor.execute(
-                "SELECT * FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_tag = ?", 
-                (guild_id, ctx.author.id, tag)
-            )
-            check = cursor.fetchone()
+            check = owner.by_tag.get(tag)
     
-            if check and check[2] == tag and check[3] != name:
+            if check and check.name != name:
                 await self.send_embed(ctx, "Invalid input!", "Tupper tag must be unique.", discord.Color.red())
-                connection.close()
                 return
     
             # Step 3: Role and optional level
             if not rest:
                 await self.send_embed(ctx, "Invalid input!", "Missing role.", discord.Color.red())
-                connection.close()
                 return
     
             parts = rest.split()
@@ -415,65 +447,45 @@ class Commands(commands.Cog):
     
             if role_raw not in ["PC", "NPC"]:
                 await self.send_embed(ctx, "Invalid input!", 'Role must be "PC" or "NPC" (case-insensitive).', discord.Color.red())
-                connection.close()
                 return
     
             role_bool = 1 if role_raw == "PC" else 0
     
-            cursor.execute(
-                "SELECT * FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?", 
-                (guild_id, ctx.author.id, name)
-            )
-            existing = cursor.fetchall()
-    
-            if existing:
+            if name in owner.by_name:
                 await self.send_embed(ctx, "Tupper of that name already registered.", f"**{name}** is being overwritten.", discord.Color.yellow())
-                cursor.execute(
-                    "DELETE FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?", 
-                    (guild_id, ctx.author.id, name)
-                )
-                connection.commit()
-                pc_amount -= len(existing)
+                await self.store.delete_tupper(guild_id, ctx.author.id, name)
+                self.tuppers.invalidate(guild_id, ctx.author.id)
+                pc_amount -= 1
     
             # PC validations
             if role_bool == 1:
                 if pc_amount >= pc_allowance:
                     await self.send_embed(ctx, "Registration failed.", "You do not have any free PC slots.", discord.Color.red())
-                    connection.close()
                     return
     
                 if level is None:
                     await self.send_embed(ctx, "Invalid input!", "PCs require a level.", discord.Color.red())
-                    connection.close()
                     return
     
                 try:
                     level_int = int(level)
                 except ValueError:
                     await self.send_embed(ctx, "Invalid input!", "Level must be an integer.", discord.Color.red())
-                    connection.close()
                     return
     
                 if level_int < 3:
                     await self.send_embed(ctx, "Invalid input!", "PCs start at level 3.", discord.Color.red())
-                    connection.close()
                     return
             else:
                 if level is not None:
                     await self.send_embed(ctx, "Invalid input!", "NPCs should not have a level.", discord.Color.red())
-                    connection.close()
                     return
                 level_int = None  # Ensure level_int is defined if NPC
     
             # Insert Tupper
-            cursor.execute(
-                "INSERT INTO Tuppers (guild_id, owner_id, tupper_tag, tupper_name, tupper_role, tupper_level, tupper_rpxp) VALUES (?, ?, ?, ?, ?, ?, ?)", 
-                (guild_id, ctx.author.id, tag, name, role_bool, level_int, 0)
-            )
+            await self.store.create_tupper(guild_id, ctx.author.id, tag, name, role_bool, level_int)
+            self.tuppers.invalidate(guild_id, ctx.author.id)
 
-            connection.commit()
-            connection.close()
-    
             message = (
                 f"You have successfully registered your Tupper. If any information is wrong please use the command again with the same name to overwrite the other inputs.\n"
                 f"If the name is wrong use `{self.prefix}retire {name}` and try again.\n"
@@ -494,17 +506,13 @@ class Commands(commands.Cog):
 
     async def _alter_ego_task(self, ctx, guild_result, content):    
         try:
-            guild_id = guild_result[0]
-    
-            connection = sqlite3.connect("./RPXP_databank.db")
-            cursor = connection.cursor()
+            guild_id = guild_result.guild_id
     
             content = content.strip()
     
             # Step 1: Get the tag
             if ' ' not in content:
                 await self.send_embed(ctx, "Invalid input!", "Missing character name.", discord.Color.red())
-                connection.close()
                 return
     
             tag, rest = content.split(' ', 1)
@@ -512,40 +520,32 @@ class Commands(commands.Cog):
             # Step 2: Get the character name in square brackets
             if not rest.startswith('['):
                 await self.send_embed(ctx, "Invalid input!", "Character name must be in square brackets.", discord.Color.red())
-                connection.close()
                 return
     
             end_bracket_index = rest.find(']')
             if end_bracket_index == -1:
                 await self.send_embed(ctx, "Invalid input!", "Closing bracket for character name is missing.", discord.Color.red())
-                connection.close()
                 return
     
             name = rest[1:end_bracket_index]
             rest = rest[end_bracket_index + 1:].strip()
     
             # Check tag uniqueness (allow overwrite if name matches)
-            cursor.execute(
-                "SELECT * FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_tag = ?", 
-                (guild_id, ctx.author.id, tag)
-            )
-            tag_check = cursor.fetchone()
+            owner = await self.store.get_owner_tuppers(guild_id, ctx.author.id)
+            tag_check = owner.by_tag.get(tag)
     
-            if tag_check and tag_check[3] != name:
+            if tag_check and tag_check.name != name:
                 await self.send_embed(ctx, "Invalid input!", "Tupper tag must be unique.", discord.Color.red())
-                connection.close()
                 return
     
             # Step 3: Get the parent name in square brackets
             if not rest.startswith('['):
                 await self.send_embed(ctx, "Invalid input!", "Parent name must be in square brackets.", discord.Color.red())
-                connection.close()
                 return
     
             end_bracket_index = rest.find(']')
             if end_bracket_index == -1:
                 await self.send_embed(ctx, "Invalid input!", "Closing bracket for parent name is missing.", discord.Color.red())
-                connection.close()
                 return
     
             parent = rest[1:end_bracket_index]
@@ -553,52 +553,31 @@ class Commands(commands.Cog):
     
             if name == parent:
                 await self.send_embed(ctx, "Invalid input!", "Alter name cannot be the same as the parent's.", discord.Color.red())
-                connection.close()
                 return
     
             # Check parent existence and role
-            cursor.execute(
-                "SELECT * FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?", 
-                (guild_id, ctx.author.id, parent)
-            )
-            adoption = cursor.fetchone()
+            adoption = owner.by_name.get(parent)
     
             if adoption is None:
                 await self.send_embed(ctx, "Invalid input!", "Parent not found. The parent needs to be one of your PC tuppers.", discord.Color.red())
-                connection.close()
                 return
     
-            parent_role = adoption[4]
-            parent_level = adoption[5]
+            parent_role = adoption.role
+            parent_level = adoption.level
     
             if parent_role != 1:
                 await self.send_embed(ctx, "Invalid input!", "Parent is not a PC. The parent needs to be one of your PC tuppers.", discord.Color.red())
-                connection.close()
                 return
     
             # Check for existing alter with same name
-            cursor.execute(
-                "SELECT * FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?", 
-                (guild_id, ctx.author.id, name)
-            )
-            existing = cursor.fetchall()
-    
-            if existing:
+            if name in owner.by_name:
                 await self.send_embed(ctx, "Tupper of that name already registered.", f"**{name}** is being overwritten.", discord.Color.yellow())
-                cursor.execute(
-                    "DELETE FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?", 
-                    (guild_id, ctx.author.id, name)
-                )
-                connection.commit()
+                await self.store.delete_tupper(guild_id, ctx.author.id, name)
+                self.tuppers.invalidate(guild_id, ctx.author.id)
     
             # Insert new alter
-            cursor.execute(
-                "INSERT INTO Tuppers (guild_id, owner_id, tupper_tag, tupper_name, tupper_role, tupper_level, parent) VALUES (?, ?, ?, ?, ?, ?, ?)", 
-                (guild_id, ctx.author.id, tag, name, 2, parent_level, parent)
-            )
-    
-            connection.commit()
-            connection.close()
+            await self.store.create_tupper(guild_id, ctx.author.id, tag, name, 2, parent_level, parent)
+            self.tuppers.invalidate(guild_id, ctx.author.id)
     
             await self.send_embed(ctx, "Alter registered.", f"{name} was registered as an alter of {parent}.", discord.Color.purple())
     
@@ -611,45 +590,32 @@ class Commands(commands.Cog):
         
     async def _retire_task(self, ctx, guild_result, content):
         try:
-            guild_id = guild_result[0]
-            connection = sqlite3.connect("./RPXP_databank.db")
-            cursor = connection.cursor()
+            guild_id = guild_result.guild_id
     
             content = content.strip()
     
             # Check for character name in square brackets
             if not content.startswith('['):
                 await self.send_embed(ctx, "Invalid input!", "Character name must be in square brackets.", discord.Color.red())
-                connection.close()
                 return
     
             end_bracket_index = content.find(']')
             if end_bracket_index == -1:
                 await self.send_embed(ctx, "Invalid input!", "Closing bracket for character name is missing.", discord.Color.red())
-                connection.close()
                 return
     
             name = content[1:end_bracket_index]
     
             # Check if tupper exists
-            cursor.execute(
-                "SELECT * FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?",
-                (guild_id, ctx.author.id, name)
-            )
-            result = cursor.fetchone()
+            result = (await self.store.get_owner_tuppers(guild_id, ctx.author.id)).by_name.get(name)
     
             if result is None:
                 await self.send_embed(ctx, "Invalid input!", f"You do not have a tupper named **{name}** registered", discord.Color.red())
-                connection.close()
                 return
     
             # Delete the tupper and all alters with this tupper as parent in one go
-            cursor.execute(
-                "DELETE FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND (tupper_name = ? OR parent = ?)",
-                (guild_id, ctx.author.id, name, name)
-            )
-            connection.commit()
-            connection.close()
+            await self.store.delete_tupper(guild_id, ctx.author.id, name, alters=True)
+            self.tuppers.invalidate(guild_id, ctx.author.id)
     
             await self.send_embed(ctx, "Tupper retired.", f"**{name}** was retired.", discord.Color.purple())
     
@@ -662,73 +628,50 @@ class Commands(commands.Cog):
         
     async def _setlevel_task(self, ctx, guild_result, content):
         try:
-            guild_id = guild_result[0]
-            connection = sqlite3.connect("./RPXP_databank.db")
-            cursor = connection.cursor()
+            guild_id = guild_result.guild_id
     
             content = content.strip()
     
             # Check for character name in square brackets
             if not content.startswith('['):
                 await self.send_embed(ctx, "Invalid input!", "Character name must be in square brackets.", discord.Color.red())
-                connection.close()
                 return
     
             end_bracket_index = content.find(']')
             if end_bracket_index == -1:
                 await self.send_embed(ctx, "Invalid input!", "Closing bracket for character name is missing.", discord.Color.red())
-                connection.close()
                 return
     
             name = content[1:end_bracket_index]
             rest = content[end_bracket_index + 1:].strip()
     
-            cursor.execute(
-                "SELECT * FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?", 
-                (guild_id, ctx.author.id, name)
-            )
-            result = cursor.fetchone()
+            result = (await self.store.get_owner_tuppers(guild_id, ctx.author.id)).by_name.get(name)
     
             if result is None:
                 await self.send_embed(ctx, "Invalid input!", f"You do not have a tupper named **{name}** registered", discord.Color.red())
-                connection.close()
                 return
     
-            role = result[4]  # tupper_role
+            role = result.role
             if role == 0:
                 await self.send_embed(ctx, "Invalid input!", f"NPCs do not have levels.", discord.Color.red())
-                connection.close()
                 return
             if role == 2:
                 await self.send_embed(ctx, "Invalid input!", f"An alter's level is linked to the parent.", discord.Color.red())
-                connection.close()
                 return
     
             try:
                 level = int(rest)
             except ValueError:
                 await self.send_embed(ctx, "Invalid input!", 'Level input has to be an integer.', discord.Color.red())
-                connection.close()
                 return
     
             if level < 3 or level > 20:
                 await self.send_embed(ctx, "Invalid input!", 'Level input has to be between **3** and **20**.', discord.Color.red())
-                connection.close()
                 return
     
-            # Update the tupper's level
-            cursor.execute(
-                "UPDATE Tuppers SET tupper_level = ? WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?",
-                (level, guild_id, ctx.author.id, name)
-            )
-            # Also update alters linked to this tupper
-            cursor.execute(
-                "UPDATE Tuppers SET tupper_level = ? WHERE guild_id = ? AND owner_id = ? AND parent = ?",
-                (level, guild_id, ctx.author.id, name)
-            )
-    
-            connection.commit()
-            connection.close()
+            # Update the tupper and all alters linked to it in one go
+            await self.store.set_tupper_level(guild_id, ctx.author.id, name, level)
+            self.tuppers.invalidate(guild_id, ctx.author.id)
     
             await self.send_embed(ctx, f"{ctx.author.display_name} sets the level of a tupper.", f"**{name}** was set to level **{level}**.", discord.Color.purple())
     
@@ -741,66 +684,46 @@ class Commands(commands.Cog):
         
     async def _levelup_task(self, ctx, guild_result, content):
         try:
-            guild_id = guild_result[0]
-            connection = sqlite3.connect("./RPXP_databank.db")
-            cursor = connection.cursor()
+            guild_id = guild_result.guild_id
         
             content = content.strip()
         
             # Step 1: Get character name in square brackets
             if not content.startswith('['):
                 await self.send_embed(ctx, "Invalid input!", "Character name must be in square brackets.", discord.Color.red())
-                connection.close()
                 return
         
             end_bracket_index = content.find(']')
             if end_bracket_index == -1:
                 await self.send_embed(ctx, "Invalid input!", "Closing bracket for character name is missing.", discord.Color.red())
-                connection.close()
                 return
         
             name = content[1:end_bracket_index]
         
-            cursor.execute(
-                "SELECT * FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?", 
-                (guild_id, ctx.author.id, name)
-            )
-            result = cursor.fetchone()
+            result = (await self.store.get_owner_tuppers(guild_id, ctx.author.id)).by_name.get(name)
         
             if result is None:
                 await self.send_embed(ctx, "Invalid input!", f"You do not have a tupper named **{name}** registered", discord.Color.red())
-                connection.close()
                 return
         
-            role = result[4]  # tupper_role
-            level = result[5]  # tupper_level
+            role = result.role
+            level = result.level
         
             if role == 0:
                 await self.send_embed(ctx, "Invalid input!", f"NPCs do not have levels.", discord.Color.red())
-                connection.close()
                 return
             if role == 2:
                 await self.send_embed(ctx, "Invalid input!", f"An alter's level is linked to the parent.", discord.Color.red())
-                connection.close()
                 return
             if level >= 20:
                 await self.send_embed(ctx, "Invalid input!", f"**{name}** cannot go beyond level **20**.", discord.Color.red())
-                connection.close()
                 return
         
             new_level = level + 1
         
-            cursor.execute(
-                "UPDATE Tuppers SET tupper_level = ? WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?",
-                (new_level, guild_id, ctx.author.id, name)
-            )
-            cursor.execute(
-                "UPDATE Tuppers SET tupper_level = ? WHERE guild_id = ? AND owner_id = ? AND parent = ?",
-                (new_level, guild_id, ctx.author.id, name)
-            )
-        
-            connection.commit()
-            connection.close()
+            # Update the tupper and all alters linked to it in one go
+            await self.store.set_tupper_level(guild_id, ctx.author.id, name, new_level)
+            self.tuppers.invalidate(guild_id, ctx.author.id)
         
             await self.send_embed(ctx, f"{ctx.author.display_name} levels up a tupper.", f"**{name}** leveled up to level **{new_level}**.", discord.Color.purple())
         
@@ -813,66 +736,46 @@ class Commands(commands.Cog):
         
     async def _leveldown_task(self, ctx, guild_result, content):
         try:
-            guild_id = guild_result[0]
-            connection = sqlite3.connect("./RPXP_databank.db")
-            cursor = connection.cursor()
+            guild_id = guild_result.guild_id
         
             content = content.strip()
         
             # Step 1: Get character name in square brackets
             if not content.startswith('['):
                 await self.send_embed(ctx, "Invalid input!", "Character name must be in square brackets.", discord.Color.red())
-                connection.close()
                 return
         
             end_bracket_index = content.find(']')
             if end_bracket_index == -1:
                 await self.send_embed(ctx, "Invalid input!", "Closing bracket for character name is missing.", discord.Color.red())
-                connection.close()
                 return
         
             name = content[1:end_bracket_index]
         
-            cursor.execute(
-                "SELECT * FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?", 
-                (guild_id, ctx.author.id, name)
-            )
-            result = cursor.fetchone()
+            result = (await self.store.get_owner_tuppers(guild_id, ctx.author.id)).by_name.get(name)
         
             if result is None:
                 await self.send_embed(ctx, "Invalid input!", f"You do not have a tupper named **{name}** registered", discord.Color.red())
-                connection.close()
                 return
         
-            role = result[4]  # tupper_role
-            level = result[5]  # tupper_level
+            role = result.role
+            level = result.level
         
             if role == 0:
                 await self.send_embed(ctx, "Invalid input!", f"NPCs do not have levels.", discord.Color.red())
-                connection.close()
                 return
             if role == 2:
                 await self.send_embed(ctx, "Invalid input!", f"An alter's level is linked to the parent.", discord.Color.red())
-                connection.close()
                 return
             if level <= 3:
                 await self.send_embed(ctx, "Invalid input!", f"**{name}** cannot go below level **3**.", discord.Color.red())
-                connection.close()
                 return
         
             new_level = level - 1
         
-            cursor.execute(
-                "UPDATE Tuppers SET tupper_level = ? WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?",
-                (new_level, guild_id, ctx.author.id, name)
-            )
-            cursor.execute(
-                "UPDATE Tuppers SET tupper_level = ? WHERE guild_id = ? AND owner_id = ? AND parent = ?",
-                (new_level, guild_id, ctx.author.id, name)
-            )
-        
-            connection.commit()
-            connection.close()
+            # Update the tupper and all alters linked to it in one go
+            await self.store.set_tupper_level(guild_id, ctx.author.id, name, new_level)
+            self.tuppers.invalidate(guild_id, ctx.author.id)
         
             await self.send_embed(ctx, f"{ctx.author.display_name} levels down a tupper.", f"**{name}** lost a level and is now at level **{new_level}**.", discord.Color.purple())
         
@@ -885,83 +788,23 @@ class Commands(commands.Cog):
     
     async def _collect_task(self, ctx, guild_result):
         try:
-            guild_id = guild_result[0]
-            cooldown = guild_result[3]
+            guild_id = guild_result.guild_id
+            cooldown = guild_result.cooldown
             owner_id = ctx.author.id
     
-            total_collected = 0
-            pool_xp = 0
-            collection_messages = []
-            cooldown_ready = False
-            any_rpxp_found = False
-            latest_last_collection = 0
-    
-            with sqlite3.connect("./RPXP_databank.db") as connection:
-                cursor = connection.cursor()
-    
-                cursor.execute(
-                    "SELECT tupper_name, tupper_role, tupper_rpxp, last_collection FROM Tuppers WHERE guild_id = ? AND owner_id = ?",
-                    (guild_id, owner_id)
-                )
-                tupper_data = cursor.fetchall()
-    
-                for name, role, rpxp, last_collection in tupper_data:
-                    rpxp = round(rpxp or 0)
-                    last_collection = last_collection or 0
-    
-                    if role == 2:
-                        continue  # Skip alters
-    
-                    if self.time - last_collection > cooldown:
-                        cooldown_ready = True
-                        cursor.execute(
-                            "UPDATE Tuppers SET last_collection = ? WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?",
-                            (self.time, guild_id, owner_id, name)
-                        )
-                    latest_last_collection = max(latest_last_collection, last_collection)
-    
-                    if rpxp > 0:
-                        any_rpxp_found = True
-                        total_collected += rpxp
-                        if role == 1:
-                            collection_messages.append(f"- **{name}** collects **{rpxp}** rp xp.")
-                        else:
-                            pool_xp += rpxp
-    
-                if pool_xp:
-                    collection_messages.append(f"- **{pool_xp}** XP from your NPCs can be applied to a PC of your choice.")
-    
-                if not cooldown_ready:
-                    await self.send_embed(ctx, "Invalid input!", f"Collection is on **cooldown**. You can collect rp xp again **<t:{latest_last_collection + cooldown}:R>**.", discord.Color.red())
-                    return
+            # Pending message XP has to be on disk before it is collected
+            await self.xp_buffer.flush()
     
-                if not any_rpxp_found:
-                    await self.send_embed(ctx, "Invalid input!", "None of your characters have **any** rp xp to collect. Please play some more and try again later.", discord.Color.red())
-                    return
+            results = await self.store.collect(guild_id, cooldown, int(time.time()), owner_id)
+            cooldown_ready, any_rpxp_found, latest_last_collection, collection_messages, _ = results.get(owner_id, (False, False, 0, [], 0))
     
-                # Update user RPXP totals
-                cursor.execute(
-                    "SELECT monthly_rpxp, total_rpxp FROM Users WHERE guild_id = ? AND user_id = ?",
-                    (guild_id, owner_id)
-                )
-                user_data = cursor.fetchone()
-                if user_data:
-                    monthly, total = user_data
-                    monthly += total_collected
-                    total += total_collected
-    
-                    cursor.execute(
-                        "UPDATE Users SET monthly_rpxp = ?, total_rpxp = ? WHERE guild_id = ? AND user_id = ?",
-                        (round(monthly), round(total), guild_id, owner_id)
-                    )
-    
-                # Reset tupper XP
-                cursor.execute(
-                    "UPDATE Tuppers SET tupper_rpxp = 0 WHERE guild_id = ? AND owner_id = ?",
-                    (guild_id, owner_id)
-                )
-    
-                connection.commit()
+            if not cooldown_ready:
+                await self.send_embed(ctx, "Invalid input!", f"Collection is on **cooldown**. You can collect rp xp again **<t:{latest_last_collection + cooldown}:R>**.", discord.Color.red())
+                return
+    
+            if not any_rpxp_found:
+                await self.send_embed(ctx, "Invalid input!", "None of your characters have **any** rp xp to collect. Please play some more and try again later.", discord.Color.red())
+                return
     
             message = "\n".join(collection_messages)
             await self.send_embed(ctx, f"{ctx.author.display_name} collects rp xp", message, discord.Color.purple())
@@ -969,13 +812,56 @@ class Commands(commands.Cog):
         except Exception as e:
             print(f"Command Error in {ctx.command.name}: {e}")
 
+    @commands.command()
+    async def collect_all(self, ctx):
+        await self.pre_command_checks(ctx, self._collect_all_task)
+
+    async def _collect_all_task(self, ctx, guild_result):
+        try:
+            if not any(role.id == guild_result.staff_role for role in ctx.author.roles):
+                await self.send_embed(ctx, "Invalid input!", "Only staff members can collect for the whole server.", discord.Color.red())
+                return
+
+            await self.xp_buffer.flush()
+            results = await self.store.collect(guild_result.guild_id, guild_result.cooldown, int(time.time()))
+
+            lines = []
+            members = 0
+            total = 0
+            for owner_id, (cooldown_ready, any_rpxp_found, _, collection_messages, collected) in results.items():
+                if not (cooldown_ready and any_rpxp_found):
+                    continue
+                member = ctx.guild.get_member(owner_id)
+                name = member.display_name if member else f"<@{owner_id}>"
+                lines.append(f"__**{name}**__ collects **{collected}** rp xp:")
+                lines.extend(collection_messages)
+                members += 1
+                total += collected
+
+            if not lines:
+                await self.send_embed(ctx, "Nothing to collect", "Nobody on this server has rp xp ready to collect.", discord.Color.red())
+                return
+
+            # One report, split only where Discord's embed size limit requires it
+            title = f"{ctx.author.display_name} collects rp xp for {members} members ({total} rp xp)"
+            pages = [""]
+            for line in lines:
+                if len(pages[-1]) + len(line) + 1 > 4000:
+                    pages.append("")
+                pages[-1] += line + "\n"
+            for page in pages:
+                await self.send_embed(ctx, title, page, discord.Color.purple())
+
+        except Exception as e:
+            print(f"Command Error in {ctx.command.name}: {e}")
+
     @commands.command()
     async def list(self, ctx, content: str):
         await self.pre_command_checks(ctx, self._list_task, content)
     
     async def _list_task(self, ctx, guild_result, content):
         try:
-            guild_id = guild_result[0]
+            guild_id = guild_result.guild_id
             owner_id = ctx.author.id
             display_name = ctx.author.display_name
         
@@ -994,17 +880,9 @@ class Commands(commands.Cog):
         
             pcs, alters, npcs = [], [], []
         
-            with sqlite3.connect("./RPXP_databank.db") as connection:
-                cursor = connection.cursor()
-                cursor.execute("SELECT * FROM Tuppers WHERE guild_id = ? AND owner_id = ?", (guild_id, owner_id))
-                results = cursor.fetchall()
+            owner = await self.store.get_owner_tuppers(guild_id, owner_id)
         
-            for row in results:
-                tag = row[2]
-                name = row[3]
-                role = row[4]
-                level = row[5]
-                parent = row[9]
+            for tag, name, role, level, parent in owner.tuppers:
         
                 if role == 1:
                     pcs.append(f"{name} {level} | `{tag}`")
@@ -1033,11 +911,98 @@ class Commands(commands.Cog):
             )
             embed_message.set_footer(text=f"Requested by {ctx.author.display_name}", icon_url=ctx.author.avatar)
         
-            await ctx.send(embed=embed_message)
+            await self.reply(ctx, embed_message)
         
         except Exception as e:
             print(f"Command Error in {ctx.command.name}: {e}")
 
+    @commands.command()
+    async def history(self, ctx, *args):
+        await self.pre_command_checks(ctx, self._history_task, args)
+
+    async def _history_task(self, ctx, guild_result, args):
+        try:
+            owner_id = ctx.author.id
+            display_name = ctx.author.display_name
+            days = 30
+
+            for arg in args:
+                if arg.lower() == "self":
+                    continue
+                if not arg.isdigit() or int(arg) == 0:
+                    await self.send_embed(ctx, "Invalid input!", f"Usage: `{self.prefix}history [self|user id] [days]`", discord.Color.red())
+                    return
+                if len(arg) >= 15:  # a member id; day counts are never that long
+                    owner_id = int(arg)
+                    member = ctx.guild.get_member(owner_id)
+                    display_name = member.display_name if member else f"<@{owner_id}>"
+                else:
+                    days = int(arg)
+
+            # Recent messages may still be in the write buffer
+            await self.xp_buffer.flush()
+            window = await self.store.xp_window(guild_result.guild_id, int(time.time()) - days * 24 * 60 * 60, owner_id)
+
+            if not window:
+                await self.send_embed(ctx, "RP history", f"{display_name} has no roleplay in the last {days} days.", discord.Color.red())
+                return
+
+            lines = [
+                f"- **{name}**: {messages} messages, {words} words, **{round(xp, 2)}** rp xp"
+                for (_, name), (messages, words, xp) in sorted(window.items(), key=lambda item: -item[1][2])
+            ]
+            total_words = sum(words for _, words, _ in window.values())
+            total_xp = sum(xp for _, _, xp in window.values())
+            lines.append(f"\nTotal: **{total_words}** words, **{round(total_xp, 2)}** rp xp")
+            await self.send_embed(ctx, f"RP history for {display_name} (last {days} days)", "\n".join(lines)[:4000], discord.Color.purple())
+        except Exception as e:
+            print(f"Command Error in {ctx.command.name}: {e}")
+
+    @commands.command()
+    async def leaderboard(self, ctx, *args):
+        await self.pre_command_checks(ctx, self._leaderboard_task, args)
+
+    async def _leaderboard_task(self, ctx, guild_result, args):
+        try:
+            window, metric, page = "monthly", "xp", 1
+
+            for arg in args:
+                arg = arg.lower()
+                if arg in ("monthly", "total"):
+                    window = arg
+                elif arg in ("words", "xp"):
+                    metric = arg
+                elif arg.isdigit() and int(arg) > 0:
+                    page = int(arg)
+                else:
+                    await self.send_embed(ctx, "Invalid input!", f"Usage: `{self.prefix}leaderboard [monthly|total] [words|xp] [page]`", discord.Color.red())
+                    return
+
+            def render(rows, page):
+                if not rows:
+                    return None
+                unit = "words" if metric == "words" else "rp xp"
+                lines = []
+                for rank, user_id, value in rows:
+                    member = ctx.guild.get_member(user_id)
+                    name = member.display_name if member else f"<@{user_id}>"
+                    lines.append(f"**{rank}.** {name} - **{round(value or 0)}** {unit}")
+                return "\n".join(lines)
+
+            await self.xp_buffer.flush()
+            description = await self.shard(ctx.guild).leaderboard.page(guild_result.guild_id, window, metric, page, render)
+
+            if description is None:
+                await self.send_embed(ctx, "Leaderboard", f"There is nobody on page {page}.", discord.Color.red())
+                return
+
+            title = f"{'Monthly' if window == 'monthly' else 'All-time'} {'word' if metric == 'words' else 'rp xp'} leaderboard for {ctx.guild.name}"
+            embed_message = discord.Embed(title=title, description=description, color=discord.Color.purple())
+            embed_message.set_footer(text=f"Page {page} | {self.prefix}leaderboard {window} {metric} {page + 1} for the next page")
+            await self.reply(ctx, embed_message)
+        except Exception as e:
+            print(f"Command Error in {ctx.command.name}: {e}")
+
     @commands.command()
     async def helpme(self, ctx):
         await self.pre_command_checks(ctx, self._helpme_task)
@@ -1053,6 +1018,7 @@ class Commands(commands.Cog):
             message += f"\n\n**`{self.prefix}cooldown <seconds>`**: \n- Sets the cooldown duration for the `{self.prefix}collect` command."
             message += f"\n\n**`{self.prefix}xp_per_word <amount>`**: \n- Sets the amount of xp that players receive per word (Standard is 0.01)."
             message += f"\n\n**`{self.prefix}level_falloff <amount>`**: \n- Sets the percentage of xp deduction for every level after third."
+            message += f"\n\n**`{self.prefix}word_rules <rules>`**: \n- Chooses what is left out of word counts: `code`, `quotes`, `ooc` ((...)), `urls`, `mentions`, `symbols` (emoji and markdown), or `none`."
             message += f"\n\n**`{self.prefix}register <tag> <[Character Name]> <role> <level>`**: \n- Allows you to register one of your tuppers. Role is either PC or NPC. When you make an NPC do not add the level at the end.\n- Entering the command again with a character name you already have overwrites that tupper."
             message += f"\n\n**`{self.prefix}alter_ego <tag> <[Character Name]> <[Parent Name]>`**: \n- Alters are tuppers which belong to a PC, such as a familiar or alternative appearance. When you roleplay with them, the rp xp is collected by the parent character."
             message += f"\n\n**`{self.prefix}retire <[Character Name]>`**: \n- Deletes the tupper from the database. This is irreversible."
@@ -1060,35 +1026,37 @@ class Commands(commands.Cog):
             message += f"\n\n**`{self.prefix}levelup <[Character Name]`**: \n- Increases the level of the tupper by one."
             message += f"\n\n**`{self.prefix}leveldown <[Character Name]`**: \n- Decreases the level of the tupper by one."
             message += f"\n\n**`{self.prefix}collect`**: \n- Collects all the accumulated rp xp for all your PC tuppers"
+            message += f"\n\n**`{self.prefix}collect_all`**: \n- Collects the rp xp of every member whose cooldown is over and posts one report (staff only)."
             message += f"\n\n**`{self.prefix}list <target>`**: \n- Shows you all the tuppers of the user with the target ID. Alternatively you can look at your own with `{self.prefix}list self`."
+            message += f"\n\n**`{self.prefix}history [self|user id] [days]`**: \n- Shows the words and rp xp each tupper earned over the last 30 days, or the number of days given."
             message += f"\n\n**`{self.prefix}msummary`**: \n- Gives server statistics based on this month's data."
             message += f"\n\n**`{self.prefix}tsummary`**: \n- Gives server statistics based on all data."
+            message += f"\n\n**`{self.prefix}leaderboard [monthly|total] [words|xp] [page]`**: \n- Shows the server's top roleplayers. Defaults to this month's rp xp."
+            message += f"\n\n**`{self.prefix}botstats`**: \n- Shows queue, database and command latency statistics for the bot (admin only)."
     
             embed_message = discord.Embed(title=f"Rp xp Bot commands.", description=message, color=discord.Color.purple())
             embed_message.set_footer(text=f"Requested by {ctx.author.display_name}", icon_url=ctx.author.avatar)
-            await ctx.send(embed = embed_message)
+            await self.reply(ctx, embed_message)
         except Exception as e:
             print(f"Command Error in {ctx.command.name}: {e}")
 
     @commands.command()
     async def msummary(self, ctx):
         try:
-            await ctx.message.delete()
+            self.outbound.delete(ctx.message)
             if ctx.author.bot:
                 return
             
             """Manually triggers the monthly stats summary for this server."""
-            connection = sqlite3.connect("./RPXP_databank.db")
-            cursor = connection.cursor()
     
             guild_id = ctx.guild.id
     
-            cursor.execute("SELECT * FROM Users WHERE guild_id = ?", (guild_id,))
-            users = cursor.fetchall()
+            await self.xp_buffer.flush()
+            stats = await self.store.guild_stats(guild_id)
     
-            total_users = len(users)
-            total_words = sum(row[2] for row in users)  # monthly_messages
-            total_xp = sum(row[3] for row in users)     # monthly_rpxp
+            total_users = stats.users if stats else 0
+            total_words = stats.monthly_words if stats else 0
+            total_xp = stats.monthly_xp if stats else 0
     
             avg_words = total_words / total_users if total_users > 0 else 0
             avg_xp = total_xp / total_users if total_users > 0 else 0
@@ -1098,15 +1066,12 @@ class Commands(commands.Cog):
             avg_words = round(avg_words)
             avg_xp = round(avg_xp)
     
-            top_user = None
+            top_user_id = None
             top_words = 0
     
-            for row in users:
-                user_id = row[1]
-                user_words = row[2]
-                if user_words > top_words:
-                    top_words = round(user_words)
-                    top_user_id = user_id
+            if stats and stats.monthly_top_words > 0:
+                top_words = round(stats.monthly_top_words)
+                top_user_id = stats.monthly_top_user
     
             message = (
                 f"Total Words: **{total_words}**\n"
@@ -1127,30 +1092,27 @@ class Commands(commands.Cog):
             if ctx.guild.icon:
                 embed_message.set_image(url=ctx.guild.icon.url)
     
-            await ctx.send(embed=embed_message)
-            connection.close()
+            await self.reply(ctx, embed_message)
         except Exception as e:
             print(f"Command Error in {ctx.command.name}: {e}")
 
     @commands.command()
     async def tsummary(self, ctx):
         try:
-            await ctx.message.delete()
+            self.outbound.delete(ctx.message)
             if ctx.author.bot:
                 return
             
             #"""Manually triggers the monthly stats summary for this server."""
-            connection = sqlite3.connect("./RPXP_databank.db")
-            cursor = connection.cursor()
     
             guild_id = ctx.guild.id
     
-            cursor.execute("SELECT * FROM Users WHERE guild_id = ?", (guild_id,))
-            users = cursor.fetchall()
+            await self.xp_buffer.flush()
+            stats = await self.store.guild_stats(guild_id)
     
-            total_users = len(users)
-            total_words = sum(row[4] for row in users)  # monthly_messages
-            total_xp = sum(row[5] for row in users)     # monthly_rpxp
+            total_users = stats.users if stats else 0
+            total_words = stats.total_words if stats else 0
+            total_xp = stats.total_xp if stats else 0
     
             avg_words = total_words / total_users if total_users > 0 else 0
             avg_xp = total_xp / total_users if total_users > 0 else 0
@@ -1160,15 +1122,12 @@ class Commands(commands.Cog):
             avg_words = int(avg_words)
             avg_xp = int(avg_xp)
     
-            top_user = None
+            top_user_id = None
             top_words = 0
     
-            for row in users:
-                user_id = row[1]
-                user_words = row[4]
-                if user_words > top_words:
-                    top_words = round(user_words)
-                    top_user_id = user_id
+            if stats and stats.total_top_words > 0:
+                top_words = round(stats.total_top_words)
+                top_user_id = stats.total_top_user
     
             message = (
                 f"Total Words: **{total_words}**\n"
@@ -1189,20 +1148,12 @@ class Commands(commands.Cog):
             if ctx.guild.icon:
                 embed_message.set_image(url=ctx.guild.icon.url)
     
-            await ctx.send(embed=embed_message)
-            connection.close()
+            await self.reply(ctx, embed_message)
         except Exception as e:
             print(f"Command Error in {ctx.command.name}: {e}")
 
-    @tasks.loop(seconds=1)
-    async def fetch_time(self):
-        dt = datetime.datetime.now(timezone.utc) 
-        utc_time = dt.replace(tzinfo=timezone.utc) 
-        self.time = int(utc_time.timestamp())
-
     @commands.Cog.listener()
     async def on_ready(self):
-        self.fetch_time.start()
         print("commands.py is ready")
 
 async def setup(client):
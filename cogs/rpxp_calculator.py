@@ -1,162 +1,222 @@
 import discord
-import re
-import sqlite3
-from discord.ext import commands, tasks
-import datetime
-from datetime import timezone
+from discord.ext import commands
 import asyncio
+import time
+from core import config
+from core.ingest import IngestQueue, IngestRecord
+from core.metrics import registry
+from core.scheduler import every
+from core.wordcount import counter_for_setting
+from core.xp import xp_for_words
+
+class ShardPipeline:
+    # Ingestion for the guilds of one gateway shard: its own queues, workers
+    # and counters, so a busy shard never holds up another one. Without
+    # gateway sharding there is a single pipeline, shard 0.
+    def __init__(self, counter, gateway_shard, sharded):
+        self.gateway_shard = gateway_shard
+        self.received = 0
+        self.queues = []
+        for shard in range(max(1, config.INGEST_SHARDS)):
+            if sharded:
+                spill_path = f"{config.INGEST_SPILL_PATH}.{gateway_shard}.{shard}.jsonl"
+                labels = {"gateway_shard": gateway_shard, "shard": shard}
+            else:
+                spill_path = f"{config.INGEST_SPILL_PATH}.{shard}.jsonl"
+                labels = {"shard": shard}
+            self.queues.append(IngestQueue(
+                config.INGEST_QUEUE_SIZE, config.INGEST_OVERFLOW, spill_path, counter.is_rp,
+                f"{gateway_shard}.{shard}" if sharded else str(shard), labels
+            ))
+        self.processed = [0] * len(self.queues)
+        self.workers = [asyncio.create_task(counter.db_worker(self, shard)) for shard in range(len(self.queues))]
+
+    def shard_for(self, guild_id, author_id):
+        return hash((guild_id, author_id)) % len(self.queues)
+
+    def stop(self):
+        for worker in self.workers:
+            worker.cancel()
+
 
 class Counter(commands.Cog):
     def __init__(self, client):
         self.client = client
-        self.time = 0
-        self.input_queue = asyncio.Queue()
-        self.level_mults = [
-            1.0,           # Level 1 → 2
-            2.0,           # Level 2 → 3
-            6.0,           # Level 3 → 4
-            12.66,         # Level 4 → 5
-            24.922,        # Level 5 → 6
-            29.9064,       # Level 6 → 7
-            36.4938,       # Level 7 → 8
-            46.3031,       # Level 8 → 9
-            52.7855,       # Level 9 → 10
-            69.148,        # Level 10 → 11
-            49.0941,       # Level 11 → 12
-            65.2891,       # Level 12 → 13
-            65.2891,       # Level 13 → 14
-            81.6114,       # Level 14 → 15
-            97.9337,       # Level 15 → 16
-            97.9337,       # Level 16 → 17
-            130.2558,      # Level 17 → 18
-            130.2558,      # Level 18 → 19
-            162.8197       # Level 19 → 20
-        ]
-
-    @tasks.loop(seconds=1)
-    async def fetch_time(self):
-        dt = datetime.datetime.now(timezone.utc) 
-        utc_time = dt.replace(tzinfo=timezone.utc) 
-        self.time = int(utc_time.timestamp())
-
-    @tasks.loop(seconds=0)
-    async def db_worker(self):
+        # Gateway shard -> ShardPipeline, created when the shard comes up.
+        # Inside a pipeline messages are routed to a queue by (guild, author)
+        # so every owner's messages are handled in order by the same worker.
+        self.sharded = isinstance(client, commands.AutoShardedBot)
+        self.pipelines = {}
+        # With RPXP_INGEST_PROCESSES set, records go to the parser processes
+        # instead (see core/process_ingest.py)
+        self.ingest = getattr(client, "ingest", None)
+        registry.register_collector("ingest", self.queue_gauges)
+
+    async def cog_load(self):
+        if self.ingest is not None:
+            return  # the writer process flushes on its own
+        await self.client.scheduler.add("xp_flush", self.client.xp_buffer.flush, every(config.XP_FLUSH_INTERVAL), persist=False)
+
+    def cog_unload(self):
+        registry.unregister_collector("ingest")
+        self.client.scheduler.remove("xp_flush")
+        for pipeline in self.pipelines.values():
+            pipeline.stop()
+
+    def pipeline(self, gateway_shard):
+        pipeline = self.pipelines.get(gateway_shard)
+        if pipeline is None:
+            pipeline = self.pipelines[gateway_shard] = ShardPipeline(self, gateway_shard, self.sharded)
+        return pipeline
+
+    @property
+    def input_queues(self):
+        return [queue for _, pipeline in sorted(self.pipelines.items()) for queue in pipeline.queues]
+
+    @property
+    def coalesced(self):
+        return sum(queue.coalesced for queue in self.input_queues)
+
+    async def db_worker(self, pipeline, shard):
+        queue = pipeline.queues[shard]
         while True:
-            item = await self.input_queue.get()
+            record = await queue.get()
+            registry.observe("rpxp_ingest_queue_wait_seconds", time.time() - record.timestamp)
             try:
-                await self.process_message(item)
+                await self.process_message(record, queue)
             except Exception as e:
-                print(f"Error processing queued message: {e}")
+                registry.inc("rpxp_messages_total", result="error")
+                print(f"Error processing queued message on shard {queue.name}: {e}")
 
-            self.input_queue.task_done()
+            pipeline.processed[shard] += 1
+            queue.task_done()
+
+    def coalesce(self, queue, record, owner, tupper, count_words):
+        # Folds messages from the same tupper queued right behind this one
+        # into the same XP update. Returns (record, words) for each of them.
+        folded = []
+        while True:
+            following = queue.peek()
+            if following is None or following.guild_id != record.guild_id or following.author_id != record.author_id:
+                break
+            found = owner.match(following.content)
+            if found is None or found[0] is not tupper:
+                break
+            queue.get_nowait()
+            queue.task_done()
+            folded.append((following, count_words(found[1])))
+
+        if folded:
+            queue.coalesced += len(folded)
+            registry.inc("rpxp_ingest_coalesced_total", len(folded))
+        return folded
+
+    def is_rp(self, record):
+        # Only answers for owners already in the cache; never touches the DB
+        owner = self.client.tuppers.peek(record.guild_id, record.author_id)
+        if owner is None:
+            return None
+        return owner.match(record.content) is not None
+
+    def shard_stats(self):
+        return [
+            {"gateway_shard": gateway_shard, "shard": queue.name, "depth": queue.qsize(), "maxsize": queue.maxsize,
+             "processed": pipeline.processed[shard], "dropped": queue.dropped, "spilled": queue.spilled,
+             "coalesced": queue.coalesced}
+            for gateway_shard, pipeline in sorted(self.pipelines.items())
+            for shard, queue in enumerate(pipeline.queues)
+        ]
+
+    def queue_gauges(self):
+        gauges = []
+        for gateway_shard, pipeline in self.pipelines.items():
+            gauges += [("rpxp_ingest_queue_depth", queue.labels, queue.qsize()) for queue in pipeline.queues]
+            if self.sharded:
+                gauges.append(("rpxp_gateway_shard_messages", {"gateway_shard": gateway_shard}, pipeline.received))
+        return gauges
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
-        if message.author.bot:
+        if message.author.bot or message.guild is None:
+            return
+        pipeline = self.pipeline(message.guild.shard_id)
+        pipeline.received += 1
+        if not self.client.tuppers.may_have_tuppers(message.guild.id, message.author.id):
+            registry.inc("rpxp_messages_total", result="prefiltered")
             return
 
-        await self.input_queue.put(message)
+        record = IngestRecord(message.guild.id, message.author.id, message.content, time.time(), message.id)
+        if self.ingest is not None:
+            await self.ingest.put(record)
+            return
+        await pipeline.queues[pipeline.shard_for(record.guild_id, record.author_id)].put(record)
 
     @commands.Cog.listener()
-    async def on_ready(self):
-        self.fetch_time.start()
-        self.db_worker.start()
-        print("rpxp_calculator.py is ready")
+    async def on_shard_ready(self, shard_id):
+        if self.ingest is None:
+            self.pipeline(shard_id)
+        print(f"rpxp_calculator.py is ready on shard {shard_id}")
 
     @commands.Cog.listener()
-    async def process_message(self, message: discord.Message):
-        content = message.content
-        guild_id = message.guild.id
-        author = message.author
-
-        connection = sqlite3.connect("./RPXP_databank.db")
-        cursor = connection.cursor()
-
-        cursor.execute("SELECT tupper_tag FROM Tuppers WHERE guild_id = ? AND owner_id = ?", (guild_id, author.id))
-        tags = [row[0] for row in cursor.fetchall()]
-        
-        # Build regex pattern to match any known tag at start of message
-        escaped_tags = [re.escape(tag) for tag in tags]
-        pattern = r'^(' + '|'.join(escaped_tags) + r')(.*)'
-        
-        match = re.match(pattern, content, re.DOTALL)
-        if not match:
-            connection.close()
-            return  # No valid tag found, exit
-        
-        tag = match.group(1)
-        message_body = match.group(2).lstrip()  # Rest of message after tag
-        word_len = len(message_body.split())
+    async def on_ready(self):
+        # Starts the pipelines up front so spilled messages from the last
+        # run are replayed before new ones arrive
+        if self.ingest is None:
+            for shard_id in (self.client.shards if self.sharded else [0]):
+                self.pipeline(shard_id)
+        print("rpxp_calculator.py is ready")
 
-        cursor.execute("SELECT * FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_tag = ?", (guild_id, author.id, tag))
+    async def process_message(self, record, queue=None):
+        guild_id = record.guild_id
+        author_id = record.author_id
 
-        result = cursor.fetchone()
+        started = time.perf_counter()
+        owner = await self.client.tuppers.get(guild_id, author_id)
+        found = owner.match(record.content)
+        registry.observe("rpxp_process_stage_seconds", time.perf_counter() - started, stage="match")
+        if found is None:
+            registry.inc("rpxp_messages_total", result="ignored")
+            return  # No valid tag found, exit
 
-        if result is None:
-            connection.close()
-            return
-        
-        tupper_name = result[3]
-        tupper_role = result [4]
-        level = result[5]
-        current_xp = result[6]
-        last_message = result[7]
-        parent = result[9]
-        
-        if parent:
-            cursor.execute("UPDATE Tuppers SET last_message = ? WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?", (self.time, guild_id, author.id, parent))
-            cursor.execute("UPDATE Tuppers SET last_message = ? WHERE guild_id = ? AND owner_id = ? AND parent = ?", (self.time, guild_id, author.id, parent))
-            cursor.execute("SELECT * FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?", (guild_id, author.id, parent))
-            parent_result = cursor.fetchone()
-            current_xp = parent_result[6]
-            print(f"{tupper_name} sent {word_len} words. RPXP applied to parent {parent}.")
-        elif tupper_role == 1:
-            cursor.execute("UPDATE Tuppers SET last_message = ? WHERE guild_id = ? AND owner_id = ? AND tupper_tag = ?", (self.time, guild_id, author.id, tag))
-            print(f"{tupper_name} sent {word_len} words.")
-        elif tupper_role == 0:
-            cursor.execute("UPDATE Tuppers SET last_message = ? WHERE guild_id = ? AND owner_id = ? AND tupper_tag = ?", (self.time, guild_id, author.id, tag))
-            cursor.execute("SELECT tupper_level FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_role = ?", (guild_id, author.id, 1))
-            levels = [row[0] for row in cursor.fetchall()]
-
-            average_level = sum(levels) / len(levels)
-            level = round(average_level)
-
-
-        # User row
-        cursor.execute("SELECT * FROM Users WHERE guild_id = ? AND user_id = ?", (guild_id, author.id))
-        user = cursor.fetchone()
-
-        if user is None:
-            cursor.execute("INSERT INTO Users (guild_id, user_id, monthly_messages, monthly_rpxp, total_messages, total_rpxp) VALUES (?, ?, ?, ?, ?, ?)", (guild_id, author.id, 0, 0, 0, 0))
-            connection.commit()
-            cursor.execute("SELECT * FROM Users WHERE guild_id = ? AND user_id = ?", (guild_id, author.id))
-            user = cursor.fetchone()
-
-        monthly = user[2]
-        total = user[4]
-
-        cursor.execute("SELECT * FROM Guilds WHERE guild_id = ?", (guild_id,))
-        guild_data = cursor.fetchone()
-        xppw = guild_data[4]
-        falloff = guild_data[5]
-
-        rpxp = (word_len * xppw * self.level_mults[level - 1] / 6) * ((100 - falloff * (level - 3)) / 100)
-        newxp = rpxp + current_xp
-
-        nmonthly = monthly + word_len
-        ntotal = total + word_len
-
-        cursor.execute("UPDATE Users SET monthly_messages = ?, total_messages = ?, monthly_rpxp = monthly_rpxp + ?, total_rpxp = total_rpxp + ? WHERE guild_id = ? AND user_id = ?", (nmonthly, ntotal, rpxp, rpxp, guild_id, author.id))
-
-        if parent:
-            cursor.execute("UPDATE Tuppers SET tupper_rpxp = ? WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?", (newxp, guild_id, author.id, parent))
-            print(f"Applied {rpxp} rpxp to {parent}")
-        else:
-            cursor.execute("UPDATE Tuppers SET tupper_rpxp = ? WHERE guild_id = ? AND owner_id = ? AND tupper_tag = ?", (newxp, guild_id, author.id, tag))
-            print(f"Applied {rpxp} rpxp to {tupper_name}")
-
-        connection.commit()
-        connection.close()
+        tupper, message_body = found
+
+        started = time.perf_counter()
+        guild_data = await self.client.guild_settings.get(guild_id)
+        registry.observe("rpxp_process_stage_seconds", time.perf_counter() - started, stage="settings")
+        if guild_data is None:
+            registry.inc("rpxp_messages_total", result="unregistered")
+            return  # Server not registered yet
+
+        count_words = counter_for_setting(guild_data.word_rules)
+        scored = [(record, count_words(message_body))]
+        if queue is not None:
+            scored += self.coalesce(queue, record, owner, tupper, count_words)
+        messages = len(scored)
+        word_len = sum(words for _, words in scored)
+        level = owner.xp_level(tupper)
+
+        if tupper.parent:
+            print(f"{tupper.name} sent {word_len} words. RPXP applied to parent {tupper.parent}.")
+        elif tupper.role == 1:
+            print(f"{tupper.name} sent {word_len} words.")
+
+        xppw = guild_data.xppw
+        falloff = guild_data.level_falloff
+
+        rpxp = xp_for_words(word_len, level, xppw, falloff)
+
+        target = tupper.parent or tupper.name
+        buffer = self.client.xp_buffer
+        buffer.add(guild_id, author_id, target, bool(tupper.parent), word_len, rpxp, int(time.time()))
+        for scored_record, words in scored:
+            buffer.event(scored_record.message_id, guild_id, author_id, target, words,
+                         xp_for_words(words, level, xppw, falloff), int(scored_record.timestamp))
+        print(f"Applied {rpxp} rpxp to {target}")
+        registry.inc("rpxp_messages_total", messages, result="rp")
+
+        if buffer.should_flush():
+            with registry.timer("rpxp_process_stage_seconds", stage="flush"):
+                await buffer.flush()
 
 
 async def setup(client):
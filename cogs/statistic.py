@@ -1,64 +1,61 @@
 import discord
-import sqlite3
-from discord.ext import commands, tasks
-import datetime
-from datetime import timezone
+from discord.ext import commands
 import asyncio
+from core import config
+from core.scheduler import monthly
 
 class Statistics(commands.Cog):
     def __init__(self, client):
         self.client = client
-        self.monthly_task.start()
+
+    async def cog_load(self):
+        await self.client.scheduler.add("monthly_stats", self.monthly_task, monthly)
 
     def cog_unload(self):
-        self.monthly_task.cancel()
+        self.client.scheduler.remove("monthly_stats")
 
-    @tasks.loop(count=1)
     async def monthly_task(self):
-        while True:
-            now = datetime.datetime.utcnow()
-            
-            # Calculate first day of next month
-            year = now.year + (now.month // 12)
-            month = (now.month % 12) + 1
-            next_month = datetime.datetime(year, month, 1, 0, 0, 0)
-
-            delta = (next_month - now).total_seconds()
-            print(f"Sleeping for {delta} seconds until next month...")
-
-            await asyncio.sleep(delta)
-
-            # Place your logic for new month here
-            print("New month has started! Resetting stats...")
-
-            await self.process_monthly_stats()
-
-    async def process_monthly_stats(self, guild):
-        connection = sqlite3.connect("./RPXP_databank.db")
-        cursor = connection.cursor()
-
-        guild_id = guild.id
-
-        cursor.execute("SELECT * FROM Users WHERE guild_id = ?", (guild_id,))
-        users = cursor.fetchall()
-
-        total_users = len(users)
-        total_words = sum(row[2] for row in users)  # monthly_messages
-        total_xp = sum(row[3] for row in users)     # monthly_rpxp
+        # May fire right after a restart to catch up, before the gateway is up
+        await self.client.wait_until_ready()
+        print("New month has started! Resetting stats...")
+        await self.process_monthly_stats()
+
+    async def process_monthly_stats(self):
+        await self.client.xp_buffer.flush()
+        guild_ids = [row.guild_id for row in await self.client.store.all_guild_stats()]
+
+        # Every guild is reported and reset on its own, at most a few at a
+        # time, so one slow or unreachable server cannot hold up the rest.
+        limit = asyncio.Semaphore(max(1, config.MONTHLY_STATS_CONCURRENCY))
+
+        async def run(guild_id):
+            async with limit:
+                try:
+                    await self.process_guild(guild_id)
+                except asyncio.TimeoutError:
+                    print(f"Timed out posting monthly stats for {guild_id}")
+                except Exception as e:
+                    print(f"Error processing monthly stats for {guild_id}: {e}")
+
+        await asyncio.gather(*(run(guild_id) for guild_id in guild_ids))
+        print(f"Monthly stats processed and reset for {len(guild_ids)} servers.")
+
+    async def process_guild(self, guild_id):
+        # The figures are read and reset in one transaction, so XP flushed
+        # while this guild waited its turn lands in one month or the other
+        row = await self.client.store.reset_month(guild_id)
+        if row is None:
+            return
+        total_users, total_words, total_xp = row.users, row.monthly_words, row.monthly_xp
+        top_words, top_user_id = row.monthly_top_words, row.monthly_top_user
+
+        guild = self.client.get_guild(guild_id)
+        if guild is None:
+            return
 
         avg_words = total_words / total_users if total_users > 0 else 0
         avg_xp = total_xp / total_users if total_users > 0 else 0
 
-        top_user_id = None
-        top_words = 0
-
-        for row in users:
-            user_id = row[1]
-            user_words = row[3]
-            if user_words > top_words:
-                top_words = user_words
-                top_user_id = user_id
-
         message = (
             f"Total Words: **{total_words}**\n"
             f"Average Words per User: **{avg_words:.2f}**\n"
@@ -68,7 +65,7 @@ class Statistics(commands.Cog):
 
         embed_message = discord.Embed(title=f"**Monthly Statistics for {guild.name}**", description=message, color=discord.Color.purple())
 
-        if top_user_id:
+        if top_words and top_words > 0:
             member = guild.get_member(top_user_id)
             if member:
                 embed_message.set_author(name=f"Top User: {member.display_name} with {top_words} words", icon_url=member.display_avatar.url)
@@ -87,14 +84,7 @@ class Statistics(commands.Cog):
                     break
 
         if channel:
-            await channel.send(embed=embed_message)
-
-        # Reset monthly stats
-        cursor.execute("UPDATE Users SET monthly_messages = 0, monthly_rpxp = 0")
-        connection.commit()
-        connection.close()
-
-        print("Monthly stats processed and reset.")
+            await asyncio.wait_for(channel.send(embed=embed_message), timeout=config.MONTHLY_SEND_TIMEOUT)
 
     @commands.Cog.listener()
     async def on_ready(self):
@@ -0,0 +1,119 @@
+import asyncio
+import glob
+import gzip
+import os
+import shutil
+import sqlite3
+import time
+
+from core.metrics import registry
+
+# Online backups with SQLite's backup API. The copy runs in a worker thread
+# a few pages at a time and pauses between steps, so the bot keeps reading
+# and writing while it runs. A write from another connection restarts the
+# copy; after RESTARTS of those it takes one consistent snapshot in a single
+# step instead, which WAL lets writers work alongside.
+
+PREFIX = "rpxp-"
+SUFFIX = ".db.gz"
+RESTARTS = 3
+
+
+class _Restarted(Exception):
+    pass
+
+
+def _copy(source, target, pages, pause):
+    restarts = 0
+    remaining_before = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, remaining_before
+        if remaining_before is not None and remaining > remaining_before:
+            restarts += 1
+            if restarts >= RESTARTS:
+                raise _Restarted()
+        remaining_before = remaining
+
+    try:
+        source.backup(target, pages=pages, progress=progress, sleep=pause)
+    except _Restarted:
+        source.backup(target, pages=-1)
+    return restarts
+
+
+def write_snapshot(db_path, directory, keep, pages=256, pause=0.005):
+    """Synchronous backup, for tools/backup.py and the worker thread. Returns (path, database bytes, compressed bytes, restarts)."""
+    os.makedirs(directory, exist_ok=True)
+    name = f"{PREFIX}{time.strftime('%Y%m%d-%H%M%S', time.gmtime())}"
+    raw_path = os.path.join(directory, f".{name}.db")
+    final_path = os.path.join(directory, name + SUFFIX)
+
+    source = sqlite3.connect(db_path, timeout=5)
+    target = sqlite3.connect(raw_path)
+    try:
+        restarts = _copy(source, target, pages, pause)
+        check = target.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            raise sqlite3.DatabaseError(f"Backup failed its integrity check: {check}")
+    finally:
+        target.close()
+        source.close()
+
+    try:
+        raw_size = os.path.getsize(raw_path)
+        with open(raw_path, "rb") as raw, gzip.open(final_path + ".part", "wb", compresslevel=6) as packed:
+            shutil.copyfileobj(raw, packed, 1024 * 1024)
+        os.replace(final_path + ".part", final_path)
+    finally:
+        os.remove(raw_path)
+
+    for old in snapshots(directory)[max(1, keep):]:
+        os.remove(old)
+    return final_path, raw_size, os.path.getsize(final_path), restarts
+
+
+def snapshots(directory):
+    """Backup files in `directory`, newest first."""
+    return sorted(glob.glob(os.path.join(directory, f"{PREFIX}*{SUFFIX}")), reverse=True)
+
+
+async def backup(db_path, directory, keep=14, pages=256, pause=0.005):
+    """Writes a compressed copy of the live database to `directory` and keeps the newest `keep`.
+
+    Returns (path, database bytes, compressed bytes, seconds).
+    """
+    started = time.perf_counter()
+    path, raw_size, size, restarts = await asyncio.to_thread(write_snapshot, db_path, directory, keep, pages, pause)
+    elapsed = time.perf_counter() - started
+
+    registry.set("rpxp_backup_seconds", elapsed)
+    registry.set("rpxp_backup_bytes", raw_size, kind="database")
+    registry.set("rpxp_backup_bytes", size, kind="compressed")
+    registry.set("rpxp_backup_last_success_timestamp", time.time())
+    registry.inc("rpxp_backups_total")
+    if restarts:
+        registry.inc("rpxp_backup_restarts_total", restarts)
+    return path, raw_size, size, elapsed
+
+
+def restore(snapshot, db_path):
+    """Replaces the database at db_path with a backup. The bot must not be running."""
+    raw_path = f"{db_path}.restore"
+    with gzip.open(snapshot, "rb") as packed, open(raw_path, "wb") as raw:
+        shutil.copyfileobj(packed, raw, 1024 * 1024)
+    try:
+        source = sqlite3.connect(raw_path)
+        target = sqlite3.connect(db_path)
+        try:
+            check = source.execute("PRAGMA quick_check").fetchone()[0]
+            if check != "ok":
+                raise sqlite3.DatabaseError(f"{snapshot} failed its integrity check: {check}")
+            # Through the backup API rather than a file copy, so the target's
+            # WAL and shared memory files stay consistent
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+    finally:
+        os.remove(raw_path)
@@ -0,0 +1,89 @@
+import os
+from dotenv import load_dotenv
+
+# Tunables read from the environment (or .env next to app.py). Everything
+# has a default that matches how the bot behaved before it was configurable.
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".env"))
+
+
+def _int(name, default):
+    return int(os.getenv(name, default))
+
+
+def _float(name, default):
+    return float(os.getenv(name, default))
+
+
+DB_PATH = os.getenv("RPXP_DB_PATH", "./RPXP_databank.db")
+
+# Where the bot keeps its data: "sqlite" (DB_PATH) or "memory" (nothing is
+# saved, for trying the bot out and for tests)
+STORAGE = os.getenv("RPXP_STORAGE", "sqlite")
+
+# Write-behind XP buffer
+XP_FLUSH_INTERVAL = _float("RPXP_FLUSH_INTERVAL", 5.0)
+XP_FLUSH_THRESHOLD = _int("RPXP_FLUSH_THRESHOLD", 200)
+
+# Message ingestion: number of worker shards, per-shard queue depth (0 means
+# unbounded) and what to do when a shard's queue is full: block, drop
+# (oldest non-roleplay message first) or spill (to INGEST_SPILL_PATH.<shard>.jsonl)
+INGEST_SHARDS = _int("RPXP_INGEST_SHARDS", 4)
+INGEST_QUEUE_SIZE = _int("RPXP_INGEST_QUEUE_SIZE", 10000)
+INGEST_OVERFLOW = os.getenv("RPXP_INGEST_OVERFLOW", "block")
+INGEST_SPILL_PATH = os.getenv("RPXP_INGEST_SPILL_PATH", "./ingest-spill")
+
+# Multi-process ingestion: INGEST_PROCESSES parser processes do the tag
+# matching and word counting and one writer process applies the XP. 0 keeps
+# everything in the bot process. INGEST_QUEUE_SIZE bounds each parser's queue.
+INGEST_PROCESSES = _int("RPXP_INGEST_PROCESSES", 0)
+
+# Gateway sharding: AUTO_SHARD=1 runs an AutoShardedBot with SHARD_COUNT
+# gateway connections (0 takes Discord's recommended count). Every gateway
+# shard gets its own ingestion queues and workers, command queue and
+# leaderboard cache.
+AUTO_SHARD = _int("RPXP_AUTO_SHARD", 0)
+SHARD_COUNT = _int("RPXP_SHARD_COUNT", 0)
+
+# Prefilter for messages from members without tuppers: "set" (exact) or
+# "bloom" (compact, for very large deployments, sized for CAPACITY owners)
+OWNER_FILTER = os.getenv("RPXP_OWNER_FILTER", "set")
+OWNER_FILTER_CAPACITY = _int("RPXP_OWNER_FILTER_CAPACITY", 1000000)
+OWNER_FILTER_ERROR_RATE = _float("RPXP_OWNER_FILTER_ERROR_RATE", 0.01)
+
+# XP ledger: events older than XP_EVENTS_RETENTION_DAYS are folded into
+# daily per-tupper snapshots every XP_COMPACT_INTERVAL seconds
+XP_EVENTS_RETENTION_DAYS = _int("RPXP_XP_EVENTS_RETENTION_DAYS", 30)
+XP_COMPACT_INTERVAL = _float("RPXP_XP_COMPACT_INTERVAL", 6 * 60 * 60)
+
+# Online backups: every BACKUP_INTERVAL seconds (0 turns them off) the
+# database is copied BACKUP_PAGES pages at a time, pausing BACKUP_STEP_PAUSE
+# seconds between steps, and gzipped into BACKUP_DIR, which keeps the newest
+# BACKUP_KEEP. Point BACKUP_DIR somewhere a deploy doesn't replace.
+BACKUP_DIR = os.getenv("RPXP_BACKUP_DIR", "./backups")
+BACKUP_INTERVAL = _float("RPXP_BACKUP_INTERVAL", 6 * 60 * 60)
+BACKUP_KEEP = _int("RPXP_BACKUP_KEEP", 14)
+BACKUP_PAGES = _int("RPXP_BACKUP_PAGES", 256)
+BACKUP_STEP_PAUSE = _float("RPXP_BACKUP_STEP_PAUSE", 0.005)
+
+# Monthly summaries: servers handled at once and how long a single post
+# may take before that server is skipped
+MONTHLY_STATS_CONCURRENCY = _int("RPXP_MONTHLY_STATS_CONCURRENCY", 5)
+MONTHLY_SEND_TIMEOUT = _float("RPXP_MONTHLY_SEND_TIMEOUT", 30.0)
+
+# Replies and command-message deletes: requests allowed per channel per
+# route (send, delete) every OUTBOUND_CHANNEL_PERIOD seconds, and per second
+# across the bot
+OUTBOUND_CHANNEL_LIMIT = _int("RPXP_OUTBOUND_CHANNEL_LIMIT", 5)
+OUTBOUND_CHANNEL_PERIOD = _float("RPXP_OUTBOUND_CHANNEL_PERIOD", 5.0)
+OUTBOUND_GLOBAL_LIMIT = _int("RPXP_OUTBOUND_GLOBAL_LIMIT", 50)
+
+# Leaderboard: rows per page and how long a rendered page is reused
+LEADERBOARD_PAGE_SIZE = _int("RPXP_LEADERBOARD_PAGE_SIZE", 10)
+LEADERBOARD_CACHE_SECONDS = _float("RPXP_LEADERBOARD_CACHE_SECONDS", 30.0)
+
+# Prometheus export: a text file rewritten every interval and/or a local
+# HTTP endpoint. Both are off unless configured.
+METRICS_FILE = os.getenv("RPXP_METRICS_FILE")
+METRICS_FILE_INTERVAL = _float("RPXP_METRICS_FILE_INTERVAL", 15.0)
+METRICS_HOST = os.getenv("RPXP_METRICS_HOST", "127.0.0.1")
+METRICS_PORT = _int("RPXP_METRICS_PORT", 0)
@@ -0,0 +1,136 @@
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.metrics import registry
+
+_TABLE = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+"?(\w+)', re.IGNORECASE)
+
+
+def _statement(sql):
+    # Short metrics label such as "SELECT Tuppers"
+    table = _TABLE.search(sql)
+    verb = sql.split(None, 1)[0].upper() if sql.strip() else "?"
+    return f"{verb} {table.group(1)}" if table else verb
+
+
+class Database:
+    # Long-lived SQLite connections owned by worker threads so that no query
+    # ever blocks the event loop. Reads go to a small pool, writes to a
+    # single thread so they never fight each other for the write lock.
+    def __init__(self, path, readers=2, busy_timeout=5000):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._executors = {
+            "read": ThreadPoolExecutor(max_workers=readers, thread_name_prefix="db-read"),
+            "write": ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-write"),
+        }
+        self._pending = {"read": 0, "write": 0}
+        self._max_pending = {"read": 0, "write": 0}
+        self._completed = {"read": 0, "write": 0}
+        self._errors = 0
+        self._wait_time = 0.0
+        self._exec_time = 0.0
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout / 1000, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout)}")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute("PRAGMA cache_size = -16000")  # 16 MB per connection
+            connection.execute("PRAGMA temp_store = MEMORY")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    async def _submit(self, kind, label, func, *args):
+        queued_at = time.perf_counter()
+
+        def job():
+            started_at = time.perf_counter()
+            connection = self._connection()
+            cursor = connection.cursor()
+            try:
+                if kind == "write":
+                    with connection:
+                        return func(cursor, *args)
+                return func(cursor, *args)
+            except Exception:
+                with self._lock:
+                    self._errors += 1
+                raise
+            finally:
+                cursor.close()
+                finished_at = time.perf_counter()
+                with self._lock:
+                    self._wait_time += started_at - queued_at
+                    self._exec_time += finished_at - started_at
+                registry.observe("rpxp_db_queue_wait_seconds", started_at - queued_at, kind=kind)
+                registry.observe("rpxp_db_statement_seconds", finished_at - started_at, kind=kind, statement=label)
+
+        self._pending[kind] += 1
+        self._max_pending[kind] = max(self._max_pending[kind], self._pending[kind])
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executors[kind], job)
+        finally:
+            self._pending[kind] -= 1
+            self._completed[kind] += 1
+
+    async def read(self, func, *args):
+        """Runs func(cursor, *args) on a reader connection."""
+        return await self._submit("read", func.__name__, func, *args)
+
+    async def transaction(self, func, *args):
+        """Runs func(cursor, *args) on the writer connection inside one transaction."""
+        return await self._submit("write", func.__name__, func, *args)
+
+    async def fetchone(self, sql, params=()):
+        return await self._submit("read", _statement(sql), lambda cursor: cursor.execute(sql, params).fetchone())
+
+    async def fetchall(self, sql, params=()):
+        return await self._submit("read", _statement(sql), lambda cursor: cursor.execute(sql, params).fetchall())
+
+    async def execute(self, sql, params=()):
+        return await self._submit("write", _statement(sql), lambda cursor: cursor.execute(sql, params).rowcount)
+
+    async def executemany(self, sql, seq_of_params):
+        return await self._submit("write", _statement(sql), lambda cursor: cursor.executemany(sql, seq_of_params).rowcount)
+
+    async def optimize(self):
+        # Periodic upkeep: refresh planner statistics and keep the WAL small
+        def upkeep(cursor):
+            cursor.execute("PRAGMA optimize")
+            cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        await self._submit("write", "optimize", upkeep)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "connections": len(self._connections),
+                "pending_reads": self._pending["read"],
+                "pending_writes": self._pending["write"],
+                "max_pending_reads": self._max_pending["read"],
+                "max_pending_writes": self._max_pending["write"],
+                "completed_reads": self._completed["read"],
+                "completed_writes": self._completed["write"],
+                "errors": self._errors,
+                "queue_wait_seconds": self._wait_time,
+                "exec_seconds": self._exec_time,
+            }
+
+    def close(self):
+        for executor in self._executors.values():
+            executor.shutdown(wait=True)
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
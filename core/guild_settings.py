@@ -0,0 +1,66 @@
+from typing import NamedTuple, Optional
+
+
+class GuildSettings(NamedTuple):
+    # Same column order as the Guilds table, so index access keeps working
+    guild_id: int
+    staff_role: Optional[int]
+    rpxp_channel: Optional[int]
+    cooldown: Optional[int]
+    xppw: Optional[float]
+    level_falloff: Optional[int]
+    word_rules: Optional[str]
+
+
+COLUMNS = ", ".join(GuildSettings._fields)
+
+
+def defaults(guild_id):
+    # What a guild starts with the first time one of its members uses a command
+    return GuildSettings(guild_id, None, None, 28800, 0.02, 5, None)
+
+
+class GuildSettingsCache:
+    # guild_id -> GuildSettings, or None for a guild without a Guilds row.
+    # Filled lazily; admin commands update entries in place after writing.
+    # listeners are called as listener(guild_id) whenever an entry is
+    # (re)loaded, updated or evicted.
+    def __init__(self, store):
+        self.store = store
+        self._guilds = {}
+        self.listeners = []
+
+    async def get(self, guild_id):
+        if guild_id in self._guilds:
+            return self._guilds[guild_id]
+        return await self.load(guild_id)
+
+    async def warm(self):
+        """Loads every guild in one scan."""
+        guilds = await self.store.all_guilds()
+        for settings in guilds:
+            self._guilds[settings.guild_id] = settings
+        return len(guilds)
+
+    async def load(self, guild_id):
+        settings = await self.store.get_guild(guild_id)
+        self._guilds[guild_id] = settings
+        self._changed(guild_id)
+        return settings
+
+    def update(self, guild_id, **fields):
+        settings = self._guilds.get(guild_id)
+        if settings is not None:
+            self._guilds[guild_id] = settings._replace(**fields)
+        self._changed(guild_id)
+
+    def evict(self, guild_id):
+        self._guilds.pop(guild_id, None)
+        self._changed(guild_id)
+
+    def _changed(self, guild_id):
+        for listener in self.listeners:
+            listener(guild_id)
+
+    def __len__(self):
+        return len(self._guilds)
@@ -0,0 +1,110 @@
+from typing import NamedTuple, Optional
+
+
+class GuildStats(NamedTuple):
+    # Same column order as the GuildStats table
+    guild_id: int
+    users: int
+    monthly_words: int
+    monthly_xp: float
+    total_words: int
+    total_xp: float
+    monthly_top_user: Optional[int]
+    monthly_top_words: int
+    total_top_user: Optional[int]
+    total_top_words: int
+
+
+COLUMNS = ", ".join(GuildStats._fields)
+
+
+def fetch(cursor, guild_id):
+    row = cursor.execute(f"SELECT {COLUMNS} FROM GuildStats WHERE guild_id = ?", (guild_id,)).fetchone()
+    return GuildStats(*row) if row else None
+
+
+def refresh(cursor, guild_id=None):
+    # Rebuilds the totals from Users, for one guild or all of them. Only
+    # needed after something lowers a user's word counts (wipes, backfills);
+    # everything else goes through Changes.
+    where = "WHERE guild_id = ?" if guild_id is not None else ""
+    params = (guild_id,) if guild_id is not None else ()
+    cursor.execute(f"DELETE FROM GuildStats {where}", params)
+    cursor.execute(
+        f"INSERT INTO GuildStats ({COLUMNS}) "
+        "SELECT guild_id, COUNT(*), SUM(monthly_messages), SUM(monthly_rpxp), SUM(total_messages), SUM(total_rpxp), "
+        "(SELECT user_id FROM Users AS u WHERE u.guild_id = g.guild_id ORDER BY monthly_messages DESC, user_id DESC LIMIT 1), "
+        "MAX(monthly_messages), "
+        "(SELECT user_id FROM Users AS u WHERE u.guild_id = g.guild_id ORDER BY total_messages DESC, user_id DESC LIMIT 1), "
+        f"MAX(total_messages) FROM Users AS g {where} GROUP BY guild_id",
+        params
+    )
+
+
+def reset_monthly(cursor, guild_id):
+    # Returns the month's figures as they were at the reset; run it in one
+    # transaction so nothing written in between is reset unreported
+    stats = fetch(cursor, guild_id)
+    cursor.execute("UPDATE Users SET monthly_messages = 0, monthly_rpxp = 0 WHERE guild_id = ?", (guild_id,))
+    cursor.execute(
+        "UPDATE GuildStats SET monthly_words = 0, monthly_xp = 0, monthly_top_user = NULL, monthly_top_words = 0 WHERE guild_id = ?",
+        (guild_id,)
+    )
+    return stats
+
+
+class Changes:
+    # Per-guild deltas gathered while a transaction writes to Users, applied
+    # to GuildStats with one statement per guild before it commits. Word
+    # counts only grow between refreshes, so the top user can only be
+    # replaced by one of the users touched here. Ties go to the higher
+    # user_id, like refresh() and the leaderboard.
+    def __init__(self):
+        self._guilds = {}
+
+    def _guild(self, guild_id):
+        # users, monthly words, monthly xp, total words, total xp,
+        # monthly top (words, user), total top (words, user); -1 words
+        # until a user is seen, so any user beats the placeholder
+        return self._guilds.setdefault(guild_id, [0, 0, 0, 0, 0, (-1, None), (-1, None)])
+
+    def user(self, guild_id, user_id, added, words, xp, monthly_words, total_words, monthly=True):
+        guild = self._guild(guild_id)
+        guild[0] += added
+        if monthly:
+            guild[1] += words
+            guild[2] += xp
+        guild[3] += words
+        guild[4] += xp
+        if (monthly_words, user_id) > guild[5]:
+            guild[5] = (monthly_words, user_id)
+        if (total_words, user_id) > guild[6]:
+            guild[6] = (total_words, user_id)
+
+    def xp(self, guild_id, monthly, total):
+        guild = self._guild(guild_id)
+        guild[2] += monthly
+        guild[4] += total
+
+    def apply(self, cursor):
+        if not self._guilds:
+            return
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO GuildStats ({COLUMNS}) VALUES (?, 0, 0, 0, 0, 0, NULL, 0, NULL, 0)",
+            [(guild_id,) for guild_id in self._guilds]
+        )
+        cursor.executemany(
+            "UPDATE GuildStats SET users = users + ?, "
+            "monthly_words = monthly_words + ?, monthly_xp = monthly_xp + ?, "
+            "total_words = total_words + ?, total_xp = total_xp + ?, "
+            "monthly_top_user = CASE WHEN ? > monthly_top_words OR (? = monthly_top_words AND ? > COALESCE(monthly_top_user, -1)) THEN ? ELSE monthly_top_user END, "
+            "monthly_top_words = MAX(monthly_top_words, ?), "
+            "total_top_user = CASE WHEN ? > total_top_words OR (? = total_top_words AND ? > COALESCE(total_top_user, -1)) THEN ? ELSE total_top_user END, "
+            "total_top_words = MAX(total_top_words, ?) "
+            "WHERE guild_id = ?",
+            [(users, monthly_words, monthly_xp, total_words, total_xp,
+              monthly_top[0], monthly_top[0], monthly_top[1], monthly_top[1], monthly_top[0],
+              total_top[0], total_top[0], total_top[1], total_top[1], total_top[0], guild_id)
+             for guild_id, (users, monthly_words, monthly_xp, total_words, total_xp, monthly_top, total_top) in self._guilds.items()]
+        )
+        self._guilds.clear()
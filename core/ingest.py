@@ -0,0 +1,174 @@
+import asyncio
+import collections
+import json
+import os
+from typing import NamedTuple, Optional
+
+from core.metrics import registry
+
+POLICIES = ("block", "drop", "spill")
+
+
+class IngestRecord(NamedTuple):
+    # The few fields of a discord.Message that scoring needs. Queues hold
+    # these instead of whole Message objects.
+    guild_id: int
+    author_id: int
+    content: str
+    timestamp: float
+    message_id: Optional[int] = None  # last, so older spill files still load
+
+
+class IngestQueue:
+    # Bounded FIFO of IngestRecords for one ingestion shard. When it is full
+    # the overflow policy decides what happens to a new record:
+    #   block - the producer waits for room
+    #   drop  - the oldest record known not to be roleplay is dropped to make
+    #           room (or the new one, if it is the non-roleplay one); if no
+    #           record is known to be safe to drop, the producer waits
+    #   spill - records go to an append-only file and are read back once
+    #           the queue has drained, in order
+    # is_rp(record) returns True, False or None when it cannot tell cheaply.
+    # labels go on the queue's metrics, {"shard": name} unless given.
+    def __init__(self, maxsize=0, policy="block", spill_path=None, is_rp=None, name="0", labels=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown ingest overflow policy {policy!r}, expected one of {', '.join(POLICIES)}")
+        if policy == "spill" and not spill_path:
+            raise ValueError("The spill overflow policy needs a spill path")
+        self.maxsize = maxsize
+        self.policy = policy
+        self.spill_path = spill_path
+        self.is_rp = is_rp or (lambda record: None)
+        self.name = name
+        self.labels = labels or {"shard": name}
+        self.dropped = 0
+        self.spilled = 0
+        self.coalesced = 0  # records the consumer folded into an earlier one
+        self._items = collections.deque()
+        self._unfinished = 0
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._done = asyncio.Event()
+        self._done.set()
+        self._writer = None
+        self._reader = None
+        self._backlog = 0  # records in the spill file not read back yet
+
+        if spill_path and os.path.exists(spill_path):
+            # Left over from a previous run: replay it before anything new
+            with open(spill_path, encoding="utf-8") as f:
+                self._backlog = sum(1 for _ in f)
+            self._unfinished += self._backlog
+            if self._backlog:
+                self._done.clear()
+                print(f"Ingest shard {name}: replaying {self._backlog} spilled messages")
+
+    def qsize(self):
+        return len(self._items) + self._backlog
+
+    def full(self):
+        return 0 < self.maxsize <= len(self._items)
+
+    def empty(self):
+        return not self._items and not self._backlog
+
+    async def put(self, record):
+        while True:
+            if self._backlog or (self.full() and self.policy == "spill"):
+                # Once spilling, everything goes to disk until it is read back
+                self._spill(record)
+                return
+            if not self.full():
+                self._items.append(record)
+                self._unfinished += 1
+                self._done.clear()
+                self._not_empty.set()
+                return
+            if self.policy == "drop" and self._shed(record):
+                return
+            if self.full():
+                self._not_full.clear()
+                await self._not_full.wait()
+
+    async def get(self):
+        while not self._items:
+            if self._backlog:
+                self._refill()
+                break
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        return self.get_nowait()
+
+    def get_nowait(self):
+        record = self._items.popleft()
+        self._not_full.set()
+        return record
+
+    def peek(self):
+        return self._items[0] if self._items else None
+
+    def task_done(self):
+        self._unfinished -= 1
+        if self._unfinished <= 0:
+            self._done.set()
+
+    async def join(self):
+        await self._done.wait()
+
+    def _shed(self, record):
+        # Returns True when the new record itself was dropped
+        if self.is_rp(record) is False:
+            self._count_drop()
+            return True
+        for index, queued in enumerate(self._items):
+            if self.is_rp(queued) is False:
+                del self._items[index]
+                self._count_drop()
+                self.task_done()
+                return False
+        return False
+
+    def _count_drop(self):
+        self.dropped += 1
+        registry.inc("rpxp_ingest_dropped_total", **self.labels)
+
+    def _spill(self, record):
+        if self._writer is None:
+            self._writer = open(self.spill_path, "a", encoding="utf-8")
+        self._writer.write(json.dumps(record) + "\n")
+        self._backlog += 1
+        self._unfinished += 1
+        self.spilled += 1
+        self._done.clear()
+        self._not_empty.set()
+        registry.inc("rpxp_ingest_spilled_total", **self.labels)
+
+    def _refill(self):
+        if self._writer is not None:
+            self._writer.flush()
+        if self._reader is None:
+            self._reader = open(self.spill_path, encoding="utf-8")
+
+        room = self.maxsize or self._backlog
+        while self._backlog and len(self._items) < room:
+            line = self._reader.readline()
+            if not line:
+                # The file is shorter than expected; forget the missing records
+                self._unfinished -= self._backlog
+                self._backlog = 0
+                break
+            self._items.append(IngestRecord(*json.loads(line)))
+            self._backlog -= 1
+
+        if not self._backlog:
+            self._close_spill()
+            if self._unfinished <= 0:
+                self._done.set()
+
+    def _close_spill(self):
+        for f in (self._writer, self._reader):
+            if f is not None:
+                f.close()
+        self._writer = self._reader = None
+        if self.spill_path and os.path.exists(self.spill_path):
+            os.remove(self.spill_path)
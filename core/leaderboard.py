@@ -0,0 +1,88 @@
+import time
+
+# (window, metric) -> Users column. Each has a (guild_id, column, user_id)
+# index, so a page is a short backwards walk of that index.
+COLUMNS = {
+    ("monthly", "words"): "monthly_messages",
+    ("monthly", "xp"): "monthly_rpxp",
+    ("total", "words"): "total_messages",
+    ("total", "xp"): "total_rpxp",
+}
+
+
+def _rows(cursor, column, guild_id, after, limit):
+    if after is None:
+        return cursor.execute(
+            f"SELECT {column}, user_id FROM Users WHERE guild_id = ? "
+            f"ORDER BY {column} DESC, user_id DESC LIMIT ?",
+            (guild_id, limit)
+        ).fetchall()
+    return cursor.execute(
+        f"SELECT {column}, user_id FROM Users WHERE guild_id = ? AND ({column}, user_id) < (?, ?) "
+        f"ORDER BY {column} DESC, user_id DESC LIMIT ?",
+        (guild_id, *after, limit)
+    ).fetchall()
+
+
+def page_rows(cursor, guild_id, window, metric, starts, page, page_size):
+    # SqliteStore.leaderboard_rows. Walks forward from the nearest page
+    # whose start is known
+    column = COLUMNS[(window, metric)]
+    known = max(p for p in starts if p <= page)
+    after = starts[known]
+    for current in range(known, page):
+        last = _rows(cursor, column, guild_id, after, page_size)
+        if len(last) < page_size:
+            return []
+        after = starts[current + 1] = tuple(last[-1])
+    return _rows(cursor, column, guild_id, after, page_size)
+
+
+class Leaderboard:
+    # Keyset pagination: a page starts right after the (value, user_id) of
+    # the last row of the page before it, so no page ever needs an OFFSET
+    # into the guild's members. Page boundaries and rendered pages are
+    # remembered for `ttl` seconds.
+    def __init__(self, store, page_size=10, ttl=30):
+        self.store = store
+        self.page_size = page_size
+        self.ttl = ttl
+        self._pages = {}   # (guild_id, window, metric, page) -> (expires, rendered)
+        self._starts = {}  # (guild_id, window, metric) -> (expires, {page: key})
+
+    async def page(self, guild_id, window, metric, page, render):
+        """Returns render(rows, page) for one page, where rows are (rank, user_id, value)."""
+        now = time.monotonic()
+        key = (guild_id, window, metric, page)
+        cached = self._pages.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        board = (guild_id, window, metric)
+        expires, starts = self._starts.get(board, (0, None))
+        if expires <= now:
+            starts = {1: None}
+            self._starts[board] = (now + self.ttl, starts)
+
+        rows = await self.store.leaderboard_rows(guild_id, window, metric, starts, page, self.page_size)
+        first = (page - 1) * self.page_size + 1
+        rendered = render([(first + i, user_id, value) for i, (value, user_id) in enumerate(rows)], page)
+
+        self._pages[key] = (now + self.ttl, rendered)
+        self._expire(now)
+        return rendered
+
+    def invalidate(self, guild_id):
+        for key in [key for key in self._pages if key[0] == guild_id]:
+            del self._pages[key]
+        for key in [key for key in self._starts if key[0] == guild_id]:
+            del self._starts[key]
+
+    def _expire(self, now):
+        for key in [key for key, (expires, _) in self._pages.items() if expires <= now]:
+            del self._pages[key]
+        for key in [key for key, (expires, _) in self._starts.items() if expires <= now]:
+            del self._starts[key]
+
+    def __len__(self):
+        return len(self._pages)
@@ -0,0 +1,242 @@
+from core.guild_settings import COLUMNS as GUILD_COLUMNS, GuildSettings, defaults
+from core.guild_stats import GuildStats
+from core.leaderboard import COLUMNS as LEADERBOARD_COLUMNS
+from core.store import DAY, Store, collect_results
+from core.tupper_cache import NO_TUPPERS, OwnerTuppers, Tupper
+
+
+class MemoryStore(Store):
+    # Everything in dicts and nothing saved (RPXP_STORAGE=memory, benchmarks
+    # and tests). Gives the same results as SqliteStore for every Store
+    # operation; tests/test_store.py checks that.
+    def __init__(self):
+        self.guilds = {}   # guild_id -> GuildSettings
+        self.users = {}    # (guild_id, user_id) -> [monthly_words, monthly_xp, total_words, total_xp]
+        self.tuppers = {}  # (guild_id, owner_id) -> tupper rows (dicts), oldest first
+        self._owners = {}  # (guild_id, owner_id) -> OwnerTuppers built from the rows
+        self.events = []     # XpEvents rows
+        self.snapshots = {}  # (guild_id, owner_id, tupper_name, day) -> [messages, words, xp]
+        self.schedule = {}   # job name -> next run
+
+    def add_guild(self, settings):
+        self.guilds[settings.guild_id] = settings
+
+    def add_user(self, guild_id, user_id, monthly_words=0, monthly_xp=0, total_words=0, total_xp=0):
+        self.users[(guild_id, user_id)] = [monthly_words, monthly_xp, total_words, total_xp]
+
+    def add_tupper(self, guild_id, owner_id, tag, name, role, level=None, parent=None, rpxp=0, last_message=None, last_collection=None):
+        # Replaces a tupper with the same tag or name, like the unique keys do
+        rows = self.tuppers.setdefault((guild_id, owner_id), [])
+        rows[:] = [row for row in rows if row["tag"] != str(tag) and row["name"] != name]
+        rows.append({
+            "tag": str(tag), "name": name, "role": role, "level": level, "parent": parent,
+            "rpxp": rpxp, "last_message": last_message, "last_collection": last_collection,
+        })
+        self._owners.pop((guild_id, owner_id), None)
+
+    def load(self, cursor):
+        """Copies Guilds, Users and Tuppers from a SQLite database."""
+        for row in cursor.execute(f"SELECT {GUILD_COLUMNS} FROM Guilds"):
+            self.add_guild(GuildSettings(*row))
+        for row in cursor.execute("SELECT guild_id, user_id, monthly_messages, monthly_rpxp, total_messages, total_rpxp FROM Users"):
+            self.add_user(*row)
+        for row in cursor.execute(
+            "SELECT guild_id, owner_id, tupper_tag, tupper_name, tupper_role, tupper_level, parent, tupper_rpxp, last_message, last_collection "
+            "FROM Tuppers ORDER BY rowid"
+        ):
+            self.add_tupper(*row)
+
+    def _owner(self, key):
+        owner = self._owners.get(key)
+        if owner is None:
+            rows = self.tuppers.get(key)
+            owner = OwnerTuppers([
+                Tupper(row["tag"], row["name"], row["role"], row["level"], row["parent"]) for row in rows
+            ]) if rows else NO_TUPPERS
+            self._owners[key] = owner
+        return owner
+
+    async def get_owner_tuppers(self, guild_id, owner_id):
+        return self._owner((guild_id, owner_id))
+
+    async def all_owner_tuppers(self):
+        return {key: self._owner(key) for key, rows in self.tuppers.items() if rows}
+
+    async def create_tupper(self, guild_id, owner_id, tag, name, role, level=None, parent=None):
+        self.add_tupper(guild_id, owner_id, tag, name, role, level, parent, None if role == 2 else 0)
+
+    async def delete_tupper(self, guild_id, owner_id, name, alters=False):
+        rows = self.tuppers.get((guild_id, owner_id), [])
+        rows[:] = [row for row in rows if row["name"] != name and not (alters and row["parent"] == name)]
+        self._owners.pop((guild_id, owner_id), None)
+
+    async def set_tupper_level(self, guild_id, owner_id, name, level):
+        for row in self.tuppers.get((guild_id, owner_id), []):
+            if row["name"] == name or row["parent"] == name:
+                row["level"] = level
+        self._owners.pop((guild_id, owner_id), None)
+
+    async def has_user(self, guild_id, user_id):
+        return (guild_id, user_id) in self.users
+
+    async def register_user(self, guild_id, user_id):
+        if (guild_id, user_id) in self.users:
+            return False
+        self.add_user(guild_id, user_id)
+        return True
+
+    async def wipe_user(self, guild_id, user_id):
+        self.users.pop((guild_id, user_id), None)
+        self.events = [event for event in self.events if event[1:3] != (guild_id, user_id)]
+        for key in [key for key in self.snapshots if key[:2] == (guild_id, user_id)]:
+            del self.snapshots[key]
+
+    async def get_guild(self, guild_id):
+        return self.guilds.get(guild_id)
+
+    async def all_guilds(self):
+        return list(self.guilds.values())
+
+    async def register_guild(self, guild_id):
+        if guild_id not in self.guilds:
+            self.add_guild(defaults(guild_id))
+
+    async def update_guild(self, guild_id, **fields):
+        if "guild_id" in fields:
+            raise ValueError("Unknown guild settings: guild_id")
+        settings = self.guilds.get(guild_id)
+        if settings is not None:
+            self.guilds[guild_id] = settings._replace(**fields)
+
+    async def delete_guild(self, guild_id):
+        self.guilds.pop(guild_id, None)
+
+    async def apply_xp_batch(self, tuppers, users, last_message, events=()):
+        self.events += events
+        for (guild_id, owner_id, name, include_alters), now in last_message.items():
+            for row in self.tuppers.get((guild_id, owner_id), []):
+                if row["name"] == name or (include_alters and row["parent"] == name):
+                    row["last_message"] = now
+        for key, (words, xp) in users.items():
+            user = self.users.setdefault(key, [0, 0, 0, 0])
+            user[0] += words
+            user[1] += xp
+            user[2] += words
+            user[3] += xp
+        for (guild_id, owner_id, name), xp in tuppers.items():
+            for row in self.tuppers.get((guild_id, owner_id), []):
+                if row["name"] == name:
+                    row["rpxp"] = (row["rpxp"] or 0) + xp
+
+    async def collect(self, guild_id, cooldown, now, owner_id=None):
+        if owner_id is None:
+            keys = sorted(key for key in self.tuppers if key[0] == guild_id)
+        else:
+            keys = [(guild_id, owner_id)]
+
+        rows = []
+        ready = set()
+        for key in keys:
+            tuppers = [row for row in self.tuppers.get(key, []) if row["role"] != 2]
+            user = self.users.get(key)
+            rows += [
+                (key[1], row["name"], row["role"], row["rpxp"], row["last_collection"],
+                 user[1] if user else None, user[3] if user else None)
+                for row in tuppers
+            ]
+            if owner_id is None and not any((row["rpxp"] or 0) > 0.5 for row in tuppers):
+                continue
+            for row in tuppers:
+                if now - (row["last_collection"] or 0) > cooldown:
+                    row["last_collection"] = now
+                    ready.add(key[1])
+
+        results, collected = collect_results(rows, ready)
+        for owner, user in collected.items():
+            if user is not None:
+                monthly, total = user
+                self.users[(guild_id, owner)][1] = round(monthly + results[owner][4])
+                self.users[(guild_id, owner)][3] = round(total + results[owner][4])
+            for row in self.tuppers.get((guild_id, owner), []):
+                row["rpxp"] = 0
+        return results
+
+    async def compact_xp_events(self, before):
+        kept = []
+        for event in self.events:
+            message_id, guild_id, owner_id, name, words, xp, timestamp = event
+            if timestamp >= before:
+                kept.append(event)
+                continue
+            snapshot = self.snapshots.setdefault((guild_id, owner_id, name, timestamp - timestamp % DAY), [0, 0, 0])
+            snapshot[0] += 1
+            snapshot[1] += words
+            snapshot[2] += xp
+        folded = len(self.events) - len(kept)
+        self.events = kept
+        return folded
+
+    async def xp_window(self, guild_id, since, owner_id=None):
+        since -= since % DAY
+        window = {}
+
+        def add(key, messages, words, xp):
+            if key[0] == guild_id and (owner_id is None or key[1] == owner_id):
+                total = window.setdefault(key[1:], [0, 0, 0])
+                total[0] += messages
+                total[1] += words
+                total[2] += xp
+
+        for (event_guild, event_owner, name, day), (messages, words, xp) in self.snapshots.items():
+            if day >= since:
+                add((event_guild, event_owner, name), messages, words, xp)
+        for _, event_guild, event_owner, name, words, xp, timestamp in self.events:
+            if timestamp >= since:
+                add((event_guild, event_owner, name), 1, words, xp)
+        return {key: tuple(total) for key, total in window.items()}
+
+    async def reset_month(self, guild_id):
+        stats = await self.guild_stats(guild_id)
+        for (user_guild, _), user in self.users.items():
+            if user_guild == guild_id:
+                user[0] = user[1] = 0
+        return stats
+
+    def _stats(self, guild_id, users):
+        monthly_top = max(users, key=lambda item: (item[1][0], item[0]))
+        total_top = max(users, key=lambda item: (item[1][2], item[0]))
+        return GuildStats(
+            guild_id, len(users),
+            sum(user[0] for _, user in users), sum(user[1] for _, user in users),
+            sum(user[2] for _, user in users), sum(user[3] for _, user in users),
+            monthly_top[0] if monthly_top[1][0] else None, monthly_top[1][0],
+            total_top[0] if total_top[1][2] else None, total_top[1][2],
+        )
+
+    def _guild_users(self):
+        guilds = {}
+        for (guild_id, user_id), user in self.users.items():
+            guilds.setdefault(guild_id, []).append((user_id, user))
+        return guilds
+
+    async def guild_stats(self, guild_id):
+        users = self._guild_users().get(guild_id)
+        return self._stats(guild_id, users) if users else None
+
+    async def all_guild_stats(self):
+        return [self._stats(guild_id, users) for guild_id, users in self._guild_users().items()]
+
+    async def leaderboard_rows(self, guild_id, window, metric, starts, page, page_size):
+        # A sort is cheap enough here; starts are only needed for SQLite
+        index = ("monthly_messages", "monthly_rpxp", "total_messages", "total_rpxp").index(LEADERBOARD_COLUMNS[(window, metric)])
+        rows = sorted(
+            ((user[index], user_id) for (user_guild, user_id), user in self.users.items() if user_guild == guild_id),
+            reverse=True
+        )
+        return rows[(page - 1) * page_size:page * page_size]
+
+    async def get_schedule(self, name):
+        return self.schedule.get(name)
+
+    async def save_schedule(self, name, next_run):
+        self.schedule[name] = next_run
@@ -0,0 +1,150 @@
+# Versioned schema migrations. Each step runs once, in order, inside its own
+# transaction; the last applied step is stored in PRAGMA user_version so the
+# runner is a no-op on an up-to-date database.
+
+
+def _base_schema(cursor):
+    # Matches the tables that already exist in production so a fresh
+    # database ends up with the same layout.
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS "Guilds" ('
+        '"guild_id" INTEGER, "staff_role" INTEGER, "rpxp_channel" INTEGER, "cooldown" INTEGER, '
+        '"xppw" INTEGER, "level_falloff" INTEGER)'
+    )
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS "Users" ('
+        '"guild_id" INTEGER, "user_id" INTEGER, "monthly_messages" INTEGER, "monthly_rpxp" INTEGER, '
+        '"total_messages" INTEGER, "total_rpxp" INTEGER)'
+    )
+    cursor.execute(
+        'CREATE TABLE IF NOT EXISTS "Tuppers" ('
+        '"guild_id" INTEGER, "owner_id" INTEGER, "tupper_tag" INTEGER, "tupper_name" TEXT, '
+        '"tupper_role" INTEGER, "tupper_level" INTEGER, "tupper_rpxp" INTEGER, "last_message" INTEGER, '
+        '"last_collection" INTEGER, "parent" TEXT)'
+    )
+
+
+def _unique_keys(cursor):
+    # Drop duplicate rows left behind by earlier races before the unique
+    # indexes go on, keeping the row most likely to be the live one.
+    cursor.execute(
+        "DELETE FROM Guilds WHERE rowid NOT IN (SELECT MIN(rowid) FROM Guilds GROUP BY guild_id)"
+    )
+    cursor.execute(
+        "DELETE FROM Users WHERE rowid NOT IN ("
+        "SELECT rowid FROM (SELECT rowid, ROW_NUMBER() OVER ("
+        "PARTITION BY guild_id, user_id ORDER BY total_messages DESC, rowid) AS n FROM Users) WHERE n = 1)"
+    )
+    cursor.execute(
+        "DELETE FROM Tuppers WHERE rowid NOT IN (SELECT MAX(rowid) FROM Tuppers GROUP BY guild_id, owner_id, tupper_tag)"
+    )
+    cursor.execute(
+        "DELETE FROM Tuppers WHERE rowid NOT IN (SELECT MAX(rowid) FROM Tuppers GROUP BY guild_id, owner_id, tupper_name)"
+    )
+
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_guilds_guild ON Guilds (guild_id)")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_users_guild_user ON Users (guild_id, user_id)")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_tuppers_owner_tag ON Tuppers (guild_id, owner_id, tupper_tag)")
+    cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_tuppers_owner_name ON Tuppers (guild_id, owner_id, tupper_name)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_tuppers_parent ON Tuppers (guild_id, owner_id, parent)")
+    cursor.execute("ANALYZE")
+
+
+def _schedule(cursor):
+    cursor.execute("CREATE TABLE IF NOT EXISTS Schedule (name TEXT PRIMARY KEY, next_run REAL NOT NULL)")
+
+
+def _guild_stats(cursor):
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS GuildStats ("
+        "guild_id INTEGER PRIMARY KEY, users INTEGER NOT NULL, "
+        "monthly_words INTEGER NOT NULL, monthly_xp REAL NOT NULL, total_words INTEGER NOT NULL, total_xp REAL NOT NULL, "
+        "monthly_top_user INTEGER, monthly_top_words INTEGER NOT NULL, total_top_user INTEGER, total_top_words INTEGER NOT NULL)"
+    )
+    # Written out rather than calling guild_stats.refresh(), so later
+    # changes to refresh() don't change what this migration did
+    cursor.execute("DELETE FROM GuildStats")
+    cursor.execute(
+        "INSERT INTO GuildStats (guild_id, users, monthly_words, monthly_xp, total_words, total_xp, "
+        "monthly_top_user, monthly_top_words, total_top_user, total_top_words) "
+        "SELECT guild_id, COUNT(*), SUM(monthly_messages), SUM(monthly_rpxp), SUM(total_messages), SUM(total_rpxp), "
+        "(SELECT user_id FROM Users AS u WHERE u.guild_id = g.guild_id ORDER BY monthly_messages DESC, user_id DESC LIMIT 1), "
+        "MAX(monthly_messages), "
+        "(SELECT user_id FROM Users AS u WHERE u.guild_id = g.guild_id ORDER BY total_messages DESC, user_id DESC LIMIT 1), "
+        "MAX(total_messages) FROM Users AS g GROUP BY guild_id"
+    )
+
+
+def _leaderboard_indexes(cursor):
+    # user_id is included so leaderboard pages are served from the index alone
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_users_monthly_words ON Users (guild_id, monthly_messages, user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_users_monthly_xp ON Users (guild_id, monthly_rpxp, user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_users_total_words ON Users (guild_id, total_messages, user_id)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_users_total_xp ON Users (guild_id, total_rpxp, user_id)")
+    cursor.execute("ANALYZE Users")
+
+
+def _word_rules(cursor):
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(Guilds)")]
+    if "word_rules" not in columns:
+        cursor.execute("ALTER TABLE Guilds ADD COLUMN word_rules TEXT")
+
+
+def _xp_ledger(cursor):
+    # Every scored message, appended with each XP flush. Compaction folds
+    # events older than the retention window into one row per tupper per
+    # UTC day (day is the timestamp of that midnight).
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS XpEvents ("
+        "message_id INTEGER, guild_id INTEGER NOT NULL, owner_id INTEGER NOT NULL, tupper_name TEXT NOT NULL, "
+        "words INTEGER NOT NULL, xp REAL NOT NULL, timestamp INTEGER NOT NULL)"
+    )
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_xpevents_owner ON XpEvents (guild_id, owner_id, timestamp)")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_xpevents_time ON XpEvents (timestamp)")
+    cursor.execute(
+        "CREATE TABLE IF NOT EXISTS XpSnapshots ("
+        "guild_id INTEGER NOT NULL, owner_id INTEGER NOT NULL, tupper_name TEXT NOT NULL, day INTEGER NOT NULL, "
+        "messages INTEGER NOT NULL, words INTEGER NOT NULL, xp REAL NOT NULL, "
+        "PRIMARY KEY (guild_id, owner_id, tupper_name, day))"
+    )
+    cursor.execute(
+        "CREATE VIEW IF NOT EXISTS XpUserSnapshots AS "
+        "SELECT guild_id, owner_id, day, SUM(messages) AS messages, SUM(words) AS words, SUM(xp) AS xp "
+        "FROM XpSnapshots GROUP BY guild_id, owner_id, day"
+    )
+
+
+MIGRATIONS = [
+    (1, "base schema", _base_schema),
+    (2, "unique keys and indexes", _unique_keys),
+    (3, "scheduler state", _schedule),
+    (4, "guild aggregates", _guild_stats),
+    (5, "leaderboard indexes", _leaderboard_indexes),
+    (6, "word counting rules", _word_rules),
+    (7, "xp event ledger", _xp_ledger),
+]
+
+
+def migrate(cursor):
+    connection = cursor.connection
+    if connection.in_transaction:
+        connection.commit()
+
+    version = cursor.execute("PRAGMA user_version").fetchone()[0]
+    applied = []
+
+    for number, name, step in MIGRATIONS:
+        if number <= version:
+            continue
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            step(cursor)
+            cursor.execute(f"PRAGMA user_version = {number}")
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        print(f"Applied migration {number}: {name}")
+        applied.append(number)
+
+    return applied
@@ -0,0 +1,183 @@
+import asyncio
+import collections
+import time
+
+import discord
+
+from core.metrics import registry
+
+# Discord's limits on one message, and on bulk deletes
+MAX_EMBEDS = 10
+MAX_EMBED_CHARS = 6000
+MAX_BULK_DELETE = 100
+BULK_DELETE_AGE = 14 * 24 * 60 * 60 - 60
+
+
+class Bucket:
+    # At most `limit` requests in any `per` seconds. Mirrors Discord's
+    # per-route buckets closely enough that requests wait here, in the
+    # channel's worker, instead of coming back as 429s.
+    def __init__(self, limit, per):
+        self.limit = limit
+        self.per = per
+        self._sent = collections.deque()
+
+    def delay(self):
+        now = time.monotonic()
+        while self._sent and now - self._sent[0] >= self.per:
+            self._sent.popleft()
+        return 0.0 if len(self._sent) < self.limit else self._sent[0] + self.per - now
+
+    async def acquire(self):
+        waited = 0.0
+        while (delay := self.delay()) > 0:
+            await asyncio.sleep(delay)
+            waited += delay
+        self._sent.append(time.monotonic())
+        return waited
+
+
+class Outbound:
+    # Queues the bot's replies and command-message deletes per channel so
+    # commands never wait on Discord's REST API. Each channel with work has
+    # one worker that drains its queue through that channel's rate-limit
+    # buckets: pending deletes go out as one bulk delete, and consecutive
+    # embeds for the same invocation go out as one message. While an
+    # invocation is held its embeds are collected, and released together.
+    def __init__(self, channel_limit=5, channel_per=5.0, global_limit=50):
+        self.channel_limit = channel_limit
+        self.channel_per = channel_per
+        self.global_bucket = Bucket(global_limit, 1.0)
+        self._queues = {}    # channel id -> deque of ("send", channel, key, embed) / ("delete", channel, message)
+        self._buckets = {}   # (channel id, route) -> Bucket
+        self._workers = {}   # channel id -> task
+        self._held = {}      # key -> [(channel, embed)]
+        self.sent = 0
+        self.deleted = 0
+        self.merged = 0
+        registry.register_collector("outbound", self.gauges)
+
+    def hold(self, key):
+        self._held.setdefault(key, [])
+
+    def release(self, key):
+        for channel, embed in self._held.pop(key, ()):
+            self._put(channel, ("send", channel, key, embed))
+
+    def send(self, channel, embed, key=None):
+        held = self._held.get(key)
+        if held is not None:
+            held.append((channel, embed))
+        else:
+            self._put(channel, ("send", channel, key, embed))
+
+    def delete(self, message):
+        self._put(message.channel, ("delete", message.channel, message))
+
+    def _put(self, channel, item):
+        self._queues.setdefault(channel.id, collections.deque()).append(item)
+        if channel.id not in self._workers:
+            self._workers[channel.id] = asyncio.create_task(self._worker(channel.id))
+
+    def _bucket(self, channel_id, route):
+        bucket = self._buckets.get((channel_id, route))
+        if bucket is None:
+            bucket = self._buckets[(channel_id, route)] = Bucket(self.channel_limit, self.channel_per)
+        return bucket
+
+    async def _acquire(self, channel_id, route):
+        waited = await self._bucket(channel_id, route).acquire()
+        waited += await self.global_bucket.acquire()
+        if waited:
+            registry.observe("rpxp_outbound_wait_seconds", waited, route=route)
+
+    async def _worker(self, channel_id):
+        queue = self._queues[channel_id]
+        try:
+            while queue:
+                if queue[0][0] == "delete":
+                    await self._delete(channel_id, queue)
+                else:
+                    await self._send(channel_id, queue)
+        finally:
+            del self._workers[channel_id]
+            if not queue:
+                self._queues.pop(channel_id, None)
+                # Buckets with nothing left to wait for go too
+                for route in ("send", "delete"):
+                    bucket = self._buckets.get((channel_id, route))
+                    if bucket is not None and not bucket.delay():
+                        del self._buckets[(channel_id, route)]
+
+    async def _delete(self, channel_id, queue):
+        # Every delete waiting in the channel, not just the ones in front:
+        # deletes don't depend on the order of sends
+        channel = queue[0][1]
+        cutoff = time.time() - BULK_DELETE_AGE
+        messages = []
+        rest = []
+        for item in queue:
+            if item[0] == "delete" and len(messages) < MAX_BULK_DELETE:
+                messages.append(item[2])
+            else:
+                rest.append(item)
+        queue.clear()
+        queue.extend(rest)
+        bulk = [message for message in messages if message.created_at.timestamp() > cutoff]
+        single = [message for message in messages if message not in bulk]
+        if len(bulk) < 2 or not hasattr(channel, "delete_messages"):
+            single, bulk = messages, []
+
+        if bulk:
+            await self._acquire(channel_id, "delete")
+            try:
+                await channel.delete_messages(bulk)
+                registry.inc("rpxp_outbound_requests_total", route="bulk_delete")
+            except Exception as e:
+                print(f"Error bulk deleting {len(bulk)} messages in {channel_id}: {e}")
+        for message in single:
+            await self._acquire(channel_id, "delete")
+            try:
+                await message.delete()
+                registry.inc("rpxp_outbound_requests_total", route="delete")
+            except discord.NotFound:
+                pass
+            except Exception as e:
+                print(f"Error deleting a message in {channel_id}: {e}")
+        self.deleted += len(messages)
+
+    async def _send(self, channel_id, queue):
+        _, channel, key, embed = queue.popleft()
+        embeds = [embed]
+        chars = len(embed)
+        while (queue and key is not None and queue[0][0] == "send" and queue[0][2] == key
+               and len(embeds) < MAX_EMBEDS and chars + len(queue[0][3]) <= MAX_EMBED_CHARS):
+            embeds.append(queue.popleft()[3])
+            chars += len(embeds[-1])
+
+        await self._acquire(channel_id, "send")
+        try:
+            await channel.send(embeds=embeds)
+            registry.inc("rpxp_outbound_requests_total", route="send")
+        except Exception as e:
+            print(f"Error sending to {channel_id}: {e}")
+        self.sent += len(embeds)
+        self.merged += len(embeds) - 1
+
+    async def drain(self, timeout):
+        """Waits up to `timeout` seconds for everything queued to go out; returns what is left."""
+        for key in list(self._held):
+            self.release(key)
+        workers = list(self._workers.values())
+        if workers:
+            await asyncio.wait(workers, timeout=timeout)
+        return sum(len(queue) for queue in self._queues.values())
+
+    def gauges(self):
+        return [
+            ("rpxp_outbound_queue_depth", {}, sum(len(queue) for queue in self._queues.values())),
+            ("rpxp_outbound_held_invocations", {}, len(self._held)),
+            ("rpxp_outbound_embeds_sent", {}, self.sent),
+            ("rpxp_outbound_embeds_merged", {}, self.merged),
+            ("rpxp_outbound_messages_deleted", {}, self.deleted),
+        ]
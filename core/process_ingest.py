@@ -0,0 +1,322 @@
+import asyncio
+import itertools
+import multiprocessing
+import queue
+import sqlite3
+import threading
+import time
+
+from core import sqlite_store
+from core.metrics import registry
+from core.wordcount import counter_for_setting
+from core.xp import xp_for_words
+from core.xp_buffer import XpBuffer
+
+# Optional multi-process ingestion, on when RPXP_INGEST_PROCESSES > 0:
+#
+#   bot process --records--> parser processes --XP deltas--> writer process
+#
+# The bot process only forwards (guild_id, author_id, content, timestamp,
+# message_id).
+# Parsers match tags and count words against their own read-only copies of
+# the tupper and guild caches, kept fresh by invalidations sent down the
+# same queues as the records. The writer is the only process that writes
+# message XP; it batches deltas with an XpBuffer and applies them with the
+# same sqlite_store.apply_xp_batch as the in-process path.
+
+BATCH = 500          # records a parser handles before passing deltas on
+FLUSH_TIMEOUT = 60.0
+FEEDER_BACKLOG = 1000  # items a feeder may hold before put() waits for it
+
+
+def _connect(path, readonly=False):
+    connection = sqlite3.connect(path, timeout=5)
+    connection.execute("PRAGMA busy_timeout = 5000")
+    if readonly:
+        connection.execute("PRAGMA query_only = ON")
+    else:
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+    return connection
+
+
+def _parser_main(records, deltas, db_path):
+    cursor = _connect(db_path, readonly=True).cursor()
+    owners = {}  # (guild_id, owner_id) -> OwnerTuppers
+    guilds = {}  # guild_id -> GuildSettings or None
+
+    while True:
+        items = [records.get()]
+        try:
+            while len(items) < BATCH:
+                items.append(records.get_nowait())
+        except queue.Empty:
+            pass
+
+        batch = []
+        counts = {}
+        for item in items:
+            kind = item[0]
+            if kind == "record":
+                _, guild_id, author_id, content, timestamp, message_id = item
+                try:
+                    result = "ignored"
+                    owner = owners.get((guild_id, author_id))
+                    if owner is None:
+                        owner = owners[(guild_id, author_id)] = sqlite_store.owner_tuppers(cursor, guild_id, author_id)
+                    found = owner.match(content)
+                    if found is not None:
+                        if guild_id not in guilds:
+                            guilds[guild_id] = sqlite_store.guild_settings(cursor, guild_id)
+                        settings = guilds[guild_id]
+                        result = "unregistered"
+                        if settings is not None:
+                            tupper, body = found
+                            words = counter_for_setting(settings.word_rules)(body)
+                            xp = xp_for_words(words, owner.xp_level(tupper), settings.xppw, settings.level_falloff)
+                            batch.append((guild_id, author_id, tupper.parent or tupper.name, bool(tupper.parent), words, xp, int(timestamp), message_id))
+                            result = "rp"
+                except Exception as e:
+                    result = "error"
+                    print(f"Error scoring message in {guild_id}: {e}")
+                counts[result] = counts.get(result, 0) + 1
+            elif kind == "tuppers":
+                _, guild_id, owner_id = item
+                if owner_id is not None:
+                    owners.pop((guild_id, owner_id), None)
+                else:
+                    for key in [key for key in owners if key[0] == guild_id]:
+                        del owners[key]
+            elif kind == "guild":
+                guilds.pop(item[1], None)
+            else:
+                # "flush" and "stop" markers go to the writer after everything
+                # queued before them
+                if batch or counts:
+                    deltas.put(("deltas", batch, counts))
+                    batch, counts = [], {}
+                deltas.put(item)
+                if kind == "stop":
+                    return
+
+        if batch or counts:
+            deltas.put(("deltas", batch, counts))
+
+
+def _writer_main(deltas, results, db_path, parsers, interval, threshold):
+    connection = _connect(db_path)
+    buffer = XpBuffer(None, threshold)
+    counts = {}
+    markers = {}  # flush token -> parsers that have passed it
+    stopped = 0
+    next_flush = time.monotonic() + interval
+
+    def flush():
+        nonlocal counts, next_flush
+        next_flush = time.monotonic() + interval
+        written = 0
+        if buffer.pending:
+            batch = buffer.take()
+            try:
+                with connection:
+                    sqlite_store.apply_xp_batch(connection.cursor(), *batch[:4])
+                buffer.flushes += 1
+                written = batch[4]
+            except sqlite3.Error as e:
+                buffer.restore(*batch)
+                print(f"Ingest writer: flush failed, will retry: {e}")
+        results.put(("status", written, buffer.pending, counts))
+        counts = {}
+        return written
+
+    while True:
+        try:
+            item = deltas.get(timeout=max(0.0, next_flush - time.monotonic()))
+        except queue.Empty:
+            flush()
+            continue
+
+        kind = item[0]
+        if kind == "deltas":
+            for guild_id, owner_id, target, include_alters, words, xp, timestamp, message_id in item[1]:
+                buffer.add(guild_id, owner_id, target, include_alters, words, xp, timestamp)
+                buffer.event(message_id, guild_id, owner_id, target, words, xp, timestamp)
+            for result, count in item[2].items():
+                counts[result] = counts.get(result, 0) + count
+            if buffer.should_flush() or time.monotonic() >= next_flush:
+                flush()
+        elif kind == "flush":
+            markers[item[1]] = markers.get(item[1], 0) + 1
+            if markers[item[1]] == parsers:
+                del markers[item[1]]
+                results.put(("flushed", item[1], flush()))
+        elif kind == "stop":
+            stopped += 1
+            if stopped == parsers:
+                flush()
+                connection.close()
+                results.put(("stopped",))
+                return
+
+
+class _Feeder:
+    # Hands items to one parser's queue from its own thread, in the order
+    # they were given, so nothing on the event loop blocks on a full queue.
+    # Records, invalidations and flush markers all go through here, which
+    # keeps an invalidation behind the records sent before it.
+    def __init__(self, records, name):
+        self.records = records
+        self.outstanding = 0
+        self._items = queue.SimpleQueue()
+        self._done = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def put(self, item):
+        with self._done:
+            self.outstanding += 1
+        self._items.put(item)
+
+    def wait(self, limit):
+        with self._done:
+            while self.outstanding > limit:
+                self._done.wait()
+
+    def close(self):
+        self._items.put(None)
+
+    def _run(self):
+        while True:
+            item = self._items.get()
+            if item is None:
+                return
+            self.records.put(item)
+            with self._done:
+                self.outstanding -= 1
+                self._done.notify_all()
+
+
+class ProcessIngest:
+    # Bot-process side of the parser and writer processes. Stands in for
+    # client.xp_buffer: flush() waits until every record sent so far has
+    # been scored and written, so commands that read XP see all of it.
+    def __init__(self, db_path, processes, queue_size=0, flush_interval=5.0, flush_threshold=200):
+        context = multiprocessing.get_context("spawn")
+        self.records = [context.Queue(queue_size) for _ in range(processes)]
+        self.deltas = context.Queue()
+        self.results = context.Queue()
+        self.parsers = [
+            context.Process(target=_parser_main, args=(records, self.deltas, db_path), name=f"rpxp-parser-{index}", daemon=True)
+            for index, records in enumerate(self.records)
+        ]
+        self.writer = context.Process(
+            target=_writer_main, args=(self.deltas, self.results, db_path, processes, flush_interval, flush_threshold),
+            name="rpxp-writer", daemon=True
+        )
+        self.feeders = [_Feeder(records, f"rpxp-feeder-{index}") for index, records in enumerate(self.records)]
+        self.sent = 0
+        self.scored = 0
+        self.pending = 0
+        self.flushes = 0
+        self.flushed_messages = 0
+        self._tokens = itertools.count()
+        self._waiting = {}  # flush token -> future
+        self._stopped = None
+        self._loop = None
+        self._reader = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = self._loop.create_future()
+        for process in (*self.parsers, self.writer):
+            process.start()
+        for feeder in self.feeders:
+            feeder.start()
+        self._reader = threading.Thread(target=self._read_results, name="rpxp-ingest-results", daemon=True)
+        self._reader.start()
+        registry.register_collector("process_ingest", self.gauges)
+
+    def _read_results(self):
+        while True:
+            item = self.results.get()
+            self._loop.call_soon_threadsafe(self._handle, item)
+            if item[0] == "stopped":
+                return
+
+    def _handle(self, item):
+        kind = item[0]
+        if kind == "status":
+            _, written, pending, counts = item
+            self.pending = pending
+            if written:
+                self.flushes += 1
+                self.flushed_messages += written
+            for result, count in counts.items():
+                self.scored += count
+                registry.inc("rpxp_messages_total", count, result=result)
+        elif kind == "flushed":
+            future = self._waiting.pop(item[1], None)
+            if future is not None and not future.done():
+                future.set_result(item[2])
+        elif kind == "stopped":
+            self._stopped.set_result(None)
+
+    def _route(self, guild_id, owner_id):
+        return self.feeders[hash((guild_id, owner_id)) % len(self.feeders)]
+
+    async def put(self, record):
+        feeder = self._route(record.guild_id, record.author_id)
+        feeder.put(("record", *record))
+        if feeder.outstanding > FEEDER_BACKLOG:
+            # The parser is behind: hold this sender back like a full queue would
+            await asyncio.to_thread(feeder.wait, FEEDER_BACKLOG)
+        self.sent += 1
+
+    def invalidate_tuppers(self, guild_id, owner_id=None):
+        # Travels with that owner's records, so messages sent after a tupper
+        # change are scored with the new tuppers. Never blocks: these run
+        # from cache listeners on the event loop.
+        if owner_id is not None:
+            self._route(guild_id, owner_id).put(("tuppers", guild_id, owner_id))
+            return
+        for feeder in self.feeders:
+            feeder.put(("tuppers", guild_id, None))
+
+    def invalidate_guild(self, guild_id):
+        for feeder in self.feeders:
+            feeder.put(("guild", guild_id))
+
+    def should_flush(self):
+        return False  # the writer flushes on its own
+
+    async def flush(self):
+        dead = [process.name for process in (*self.parsers, self.writer) if not process.is_alive()]
+        if dead:
+            raise RuntimeError(f"Ingest process(es) not running: {', '.join(dead)}")
+        token = next(self._tokens)
+        future = self._waiting[token] = self._loop.create_future()
+        for feeder in self.feeders:
+            feeder.put(("flush", token))
+        try:
+            return await asyncio.wait_for(future, FLUSH_TIMEOUT)
+        finally:
+            self._waiting.pop(token, None)
+
+    async def stop(self):
+        """Writes out everything still queued and shuts the processes down."""
+        for feeder in self.feeders:
+            feeder.put(("stop",))
+            feeder.close()
+        await asyncio.wait_for(self._stopped, FLUSH_TIMEOUT)
+        for process in (*self.parsers, self.writer):
+            await asyncio.to_thread(process.join, 5)
+        registry.unregister_collector("process_ingest")
+
+    def gauges(self):
+        return [
+            ("rpxp_ingest_process_backlog", {}, self.sent - self.scored),
+            ("rpxp_ingest_feeder_backlog", {}, sum(feeder.outstanding for feeder in self.feeders)),
+            ("rpxp_ingest_processes_alive", {}, sum(process.is_alive() for process in (*self.parsers, self.writer))),
+        ]
@@ -0,0 +1,141 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import time
+from datetime import timezone
+
+from core.metrics import registry
+
+
+def every(seconds):
+    return lambda after: after + seconds
+
+
+def monthly(after):
+    # Midnight UTC on the first day of the month following `after`
+    moment = datetime.datetime.fromtimestamp(after, timezone.utc)
+    year = moment.year + (moment.month // 12)
+    month = (moment.month % 12) + 1
+    return datetime.datetime(year, month, 1, tzinfo=timezone.utc).timestamp()
+
+
+class Job:
+    def __init__(self, name, func, next_time, persist):
+        self.name = name
+        self.func = func
+        self.next_time = next_time
+        self.persist = persist
+        self.next_run = None
+        self.runs = 0
+
+
+class Scheduler:
+    # A single timer heap for every recurring job. The loop sleeps until the
+    # earliest job is due, so nothing wakes up just to check the clock.
+    # Persistent jobs keep their next run in the store; a job that came due
+    # while the bot was down runs once as soon as it is added.
+    def __init__(self, store):
+        self.store = store
+        self.jobs = {}
+        self._heap = []
+        self._order = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._running = set()
+
+    async def add(self, name, func, next_time, persist=True):
+        job = Job(name, func, next_time, persist)
+        now = time.time()
+        stored = None
+        if persist:
+            stored = await self.store.get_schedule(name)
+
+        if stored is None:
+            job.next_run = next_time(now)
+            if persist:
+                await self._save(job)
+        else:
+            job.next_run = stored
+            if stored <= now:
+                print(f"Scheduled job {name} was missed while offline, running it now.")
+
+        self.jobs[name] = job
+        self._push(job)
+        return job
+
+    def remove(self, name):
+        self.jobs.pop(name, None)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self, timeout=30.0):
+        # No new runs from here on; jobs already running get `timeout`
+        # seconds to finish (a flush or a monthly reset cut short loses
+        # work) before they are cancelled
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        running = list(self._running)
+        if not running:
+            return
+        try:
+            await asyncio.wait_for(asyncio.gather(*running, return_exceptions=True), timeout)
+        except asyncio.TimeoutError:
+            print(f"Scheduled jobs still running after {timeout:g} s were cancelled")
+
+    def _push(self, job):
+        heapq.heappush(self._heap, (job.next_run, next(self._order), job))
+        self._wakeup.set()
+
+    async def _save(self, job):
+        await self.store.save_schedule(job.name, job.next_run)
+
+    async def _loop(self):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            next_run, _, job = self._heap[0]
+            delay = next_run - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            heapq.heappop(self._heap)
+            if self.jobs.get(job.name) is not job:
+                continue  # Removed or replaced
+
+            task = asyncio.create_task(self._execute(job))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _execute(self, job):
+        # The next run is only scheduled once this one has finished, so a
+        # slow job never overlaps itself.
+        started = time.perf_counter()
+        try:
+            await job.func()
+        except Exception as e:
+            registry.inc("rpxp_scheduler_errors_total", job=job.name)
+            print(f"Scheduled job {job.name} failed: {e}")
+        finally:
+            registry.observe("rpxp_scheduler_job_seconds", time.perf_counter() - started, job=job.name)
+
+        job.runs += 1
+        job.next_run = job.next_time(max(time.time(), job.next_run))
+        if self.jobs.get(job.name) is not job:
+            return
+        if job.persist:
+            try:
+                await self._save(job)
+            except Exception as e:
+                print(f"Could not persist next run of {job.name}: {e}")
+        self._push(job)
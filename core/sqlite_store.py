@@ -0,0 +1,303 @@
+import itertools
+
+from core import guild_stats, leaderboard
+from core.guild_settings import COLUMNS as GUILD_COLUMNS, GuildSettings, defaults
+from core.guild_stats import COLUMNS as STATS_COLUMNS, GuildStats
+from core.store import DAY, Store, collect_results
+from core.tupper_cache import NO_TUPPERS, OwnerTuppers, Tupper
+
+# Cursor functions first, so tools and the ingest processes that hold their
+# own connections can run them too; SqliteStore runs them on a Database.
+
+
+def owner_tuppers(cursor, guild_id, owner_id):
+    rows = cursor.execute(
+        "SELECT tupper_tag, tupper_name, tupper_role, tupper_level, parent FROM Tuppers WHERE guild_id = ? AND owner_id = ?",
+        (guild_id, owner_id)
+    ).fetchall()
+    return OwnerTuppers([Tupper(str(row[0]), *row[1:]) for row in rows]) if rows else NO_TUPPERS
+
+
+def all_owner_tuppers(cursor):
+    rows = cursor.execute(
+        "SELECT guild_id, owner_id, tupper_tag, tupper_name, tupper_role, tupper_level, parent FROM Tuppers ORDER BY guild_id, owner_id"
+    )
+    return {
+        key: OwnerTuppers([Tupper(str(row[2]), *row[3:]) for row in group])
+        for key, group in itertools.groupby(rows, key=lambda row: (row[0], row[1]))
+    }
+
+
+def create_tupper(cursor, guild_id, owner_id, tag, name, role, level=None, parent=None):
+    cursor.execute(
+        "INSERT INTO Tuppers (guild_id, owner_id, tupper_tag, tupper_name, tupper_role, tupper_level, tupper_rpxp, parent) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (guild_id, owner_id, tag, name, role, level, None if role == 2 else 0, parent)
+    )
+
+
+def delete_tupper(cursor, guild_id, owner_id, name, alters=False):
+    cursor.execute(
+        "DELETE FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND (tupper_name = ? OR parent = ?)",
+        (guild_id, owner_id, name, name if alters else None)
+    )
+
+
+def set_tupper_level(cursor, guild_id, owner_id, name, level):
+    cursor.execute(
+        "UPDATE Tuppers SET tupper_level = ? WHERE guild_id = ? AND owner_id = ? AND (tupper_name = ? OR parent = ?)",
+        (level, guild_id, owner_id, name, name)
+    )
+
+
+def has_user(cursor, guild_id, user_id):
+    return cursor.execute("SELECT 1 FROM Users WHERE guild_id = ? AND user_id = ?", (guild_id, user_id)).fetchone() is not None
+
+
+def register_user(cursor, guild_id, user_id):
+    added = cursor.execute(
+        "INSERT OR IGNORE INTO Users (guild_id, user_id, monthly_messages, monthly_rpxp, total_messages, total_rpxp) VALUES (?, ?, 0, 0, 0, 0)",
+        (guild_id, user_id)
+    ).rowcount
+    changes = guild_stats.Changes()
+    changes.user(guild_id, user_id, added, 0, 0, 0, 0)
+    changes.apply(cursor)
+    return bool(added)
+
+
+def wipe_user(cursor, guild_id, user_id):
+    cursor.execute("DELETE FROM Users WHERE guild_id = ? AND user_id = ?", (guild_id, user_id))
+    cursor.execute("DELETE FROM XpEvents WHERE guild_id = ? AND owner_id = ?", (guild_id, user_id))
+    cursor.execute("DELETE FROM XpSnapshots WHERE guild_id = ? AND owner_id = ?", (guild_id, user_id))
+    guild_stats.refresh(cursor, guild_id)
+
+
+def guild_settings(cursor, guild_id):
+    row = cursor.execute(f"SELECT {GUILD_COLUMNS} FROM Guilds WHERE guild_id = ?", (guild_id,)).fetchone()
+    return GuildSettings(*row) if row else None
+
+
+def all_guild_settings(cursor):
+    return [GuildSettings(*row) for row in cursor.execute(f"SELECT {GUILD_COLUMNS} FROM Guilds")]
+
+
+def register_guild(cursor, guild_id):
+    cursor.execute(
+        f"INSERT OR IGNORE INTO Guilds ({GUILD_COLUMNS}) VALUES ({', '.join('?' * len(GuildSettings._fields))})",
+        defaults(guild_id)
+    )
+
+
+def update_guild(cursor, guild_id, fields):
+    # Column names straight from GuildSettings, never from user input
+    unknown = set(fields) - set(GuildSettings._fields[1:])
+    if unknown:
+        raise ValueError(f"Unknown guild settings: {', '.join(sorted(unknown))}")
+    cursor.execute(
+        f"UPDATE Guilds SET {', '.join(f'{name} = ?' for name in fields)} WHERE guild_id = ?",
+        (*fields.values(), guild_id)
+    )
+
+
+def delete_guild(cursor, guild_id):
+    cursor.execute("DELETE FROM Guilds WHERE guild_id = ?", (guild_id,))
+
+
+def apply_xp_batch(cursor, tuppers, users, last_message, events=(), monthly=True):
+    # monthly=False leaves the monthly counters alone, for XP from earlier
+    # months (tools/backfill.py)
+    cursor.executemany(
+        "UPDATE Tuppers SET last_message = ? WHERE guild_id = ? AND owner_id = ? AND (tupper_name = ? OR parent = ?)",
+        [(now, guild_id, owner_id, name, name if include_alters else None)
+         for (guild_id, owner_id, name, include_alters), now in last_message.items()]
+    )
+    # One user at a time so the new counts can feed GuildStats
+    changes = guild_stats.Changes()
+    for (guild_id, user_id), (words, xp) in users.items():
+        added = cursor.execute(
+            "INSERT OR IGNORE INTO Users (guild_id, user_id, monthly_messages, monthly_rpxp, total_messages, total_rpxp) VALUES (?, ?, 0, 0, 0, 0)",
+            (guild_id, user_id)
+        ).rowcount
+        month_words, month_xp = (words, xp) if monthly else (0, 0)
+        monthly_words, total_words = cursor.execute(
+            "UPDATE Users SET monthly_messages = monthly_messages + ?, total_messages = total_messages + ?, monthly_rpxp = monthly_rpxp + ?, total_rpxp = total_rpxp + ? "
+            "WHERE guild_id = ? AND user_id = ? RETURNING monthly_messages, total_messages",
+            (month_words, words, month_xp, xp, guild_id, user_id)
+        ).fetchone()
+        changes.user(guild_id, user_id, added, words, xp, monthly_words, total_words, monthly)
+    changes.apply(cursor)
+    cursor.executemany(
+        "UPDATE Tuppers SET tupper_rpxp = COALESCE(tupper_rpxp, 0) + ? WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?",
+        [(xp, guild_id, owner_id, name) for (guild_id, owner_id, name), xp in tuppers.items()]
+    )
+    cursor.executemany(
+        "INSERT INTO XpEvents (message_id, guild_id, owner_id, tupper_name, words, xp, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        events
+    )
+
+
+def collect(cursor, guild_id, cooldown, now, owner_id=None):
+    owner_filter = "" if owner_id is None else " AND t.owner_id = ?"
+    params = (guild_id,) if owner_id is None else (guild_id, owner_id)
+
+    # Alters never hold rp xp of their own, so they are left out throughout
+    rows = cursor.execute(
+        "SELECT t.owner_id, t.tupper_name, t.tupper_role, t.tupper_rpxp, t.last_collection, u.monthly_rpxp, u.total_rpxp "
+        "FROM Tuppers AS t LEFT JOIN Users AS u ON u.guild_id = t.guild_id AND u.user_id = t.owner_id "
+        f"WHERE t.guild_id = ? AND t.tupper_role != 2{owner_filter} ORDER BY t.owner_id, t.rowid",
+        params
+    ).fetchall()
+
+    # Start a new cooldown on every tupper that is off cooldown; the
+    # owners that come back are the ones allowed to collect. A bulk
+    # collect leaves members with nothing to collect alone.
+    if owner_id is None:
+        owner_filter = " AND owner_id IN (SELECT owner_id FROM Tuppers WHERE guild_id = ? AND tupper_role != 2 AND tupper_rpxp > 0.5)"
+    else:
+        owner_filter = " AND owner_id = ?"
+    ready = {row[0] for row in cursor.execute(
+        "UPDATE Tuppers SET last_collection = ? "
+        f"WHERE guild_id = ? AND tupper_role != 2 AND ? - COALESCE(last_collection, 0) > ?{owner_filter} "
+        "RETURNING owner_id",
+        (now, guild_id, now, cooldown, guild_id if owner_id is None else owner_id)
+    ).fetchall()}
+
+    results, collected = collect_results(rows, ready)
+    changes = guild_stats.Changes()
+    user_updates = []
+    for owner, user in collected.items():
+        if user is not None:
+            monthly, total = user
+            new_monthly, new_total = round(monthly + results[owner][4]), round(total + results[owner][4])
+            user_updates.append((new_monthly, new_total, guild_id, owner))
+            changes.xp(guild_id, new_monthly - monthly, new_total - total)
+
+    cursor.executemany(
+        "UPDATE Users SET monthly_rpxp = ?, total_rpxp = ? WHERE guild_id = ? AND user_id = ?",
+        user_updates
+    )
+    cursor.executemany(
+        "UPDATE Tuppers SET tupper_rpxp = 0 WHERE guild_id = ? AND owner_id = ?",
+        [(guild_id, owner) for owner in collected]
+    )
+    changes.apply(cursor)
+    return results
+
+
+def compact_xp_events(cursor, before):
+    cursor.execute(
+        "INSERT INTO XpSnapshots (guild_id, owner_id, tupper_name, day, messages, words, xp) "
+        f"SELECT guild_id, owner_id, tupper_name, timestamp - timestamp % {DAY}, COUNT(*), SUM(words), SUM(xp) "
+        "FROM XpEvents WHERE timestamp < ? GROUP BY 1, 2, 3, 4 "
+        "ON CONFLICT (guild_id, owner_id, tupper_name, day) DO UPDATE SET "
+        "messages = messages + excluded.messages, words = words + excluded.words, xp = xp + excluded.xp",
+        (before,)
+    )
+    return cursor.execute("DELETE FROM XpEvents WHERE timestamp < ?", (before,)).rowcount
+
+
+def xp_window(cursor, guild_id, since, owner_id=None):
+    # Snapshots for the compacted days, raw events for the rest
+    since -= since % DAY
+    owner_filter = "" if owner_id is None else " AND owner_id = ?"
+    params = (guild_id, since) if owner_id is None else (guild_id, since, owner_id)
+    rows = cursor.execute(
+        "SELECT owner_id, tupper_name, SUM(messages), SUM(words), SUM(xp) FROM ("
+        f"SELECT owner_id, tupper_name, messages, words, xp FROM XpSnapshots WHERE guild_id = ? AND day >= ?{owner_filter} "
+        "UNION ALL "
+        f"SELECT owner_id, tupper_name, 1, words, xp FROM XpEvents WHERE guild_id = ? AND timestamp >= ?{owner_filter}"
+        ") GROUP BY owner_id, tupper_name",
+        params * 2
+    )
+    return {(owner, name): (messages, words, xp) for owner, name, messages, words, xp in rows}
+
+
+def all_guild_stats(cursor):
+    return [GuildStats(*row) for row in cursor.execute(f"SELECT {STATS_COLUMNS} FROM GuildStats")]
+
+
+def get_schedule(cursor, name):
+    row = cursor.execute("SELECT next_run FROM Schedule WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def save_schedule(cursor, name, next_run):
+    cursor.execute(
+        "INSERT INTO Schedule (name, next_run) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET next_run = excluded.next_run",
+        (name, next_run)
+    )
+
+
+class SqliteStore(Store):
+    # The bot's storage: the cursor functions above, run on the Database's
+    # reader pool or its single writer thread.
+    def __init__(self, db):
+        self.db = db
+
+    async def get_owner_tuppers(self, guild_id, owner_id):
+        return await self.db.read(owner_tuppers, guild_id, owner_id)
+
+    async def all_owner_tuppers(self):
+        return await self.db.read(all_owner_tuppers)
+
+    async def create_tupper(self, guild_id, owner_id, tag, name, role, level=None, parent=None):
+        await self.db.transaction(create_tupper, guild_id, owner_id, tag, name, role, level, parent)
+
+    async def delete_tupper(self, guild_id, owner_id, name, alters=False):
+        await self.db.transaction(delete_tupper, guild_id, owner_id, name, alters)
+
+    async def set_tupper_level(self, guild_id, owner_id, name, level):
+        await self.db.transaction(set_tupper_level, guild_id, owner_id, name, level)
+
+    async def has_user(self, guild_id, user_id):
+        return await self.db.read(has_user, guild_id, user_id)
+
+    async def register_user(self, guild_id, user_id):
+        return await self.db.transaction(register_user, guild_id, user_id)
+
+    async def wipe_user(self, guild_id, user_id):
+        await self.db.transaction(wipe_user, guild_id, user_id)
+
+    async def get_guild(self, guild_id):
+        return await self.db.read(guild_settings, guild_id)
+
+    async def all_guilds(self):
+        return await self.db.read(all_guild_settings)
+
+    async def register_guild(self, guild_id):
+        await self.db.transaction(register_guild, guild_id)
+
+    async def update_guild(self, guild_id, **fields):
+        await self.db.transaction(update_guild, guild_id, fields)
+
+    async def delete_guild(self, guild_id):
+        await self.db.transaction(delete_guild, guild_id)
+
+    async def apply_xp_batch(self, tuppers, users, last_message, events=()):
+        await self.db.transaction(apply_xp_batch, tuppers, users, last_message, events)
+
+    async def compact_xp_events(self, before):
+        return await self.db.transaction(compact_xp_events, before)
+
+    async def xp_window(self, guild_id, since, owner_id=None):
+        return await self.db.read(xp_window, guild_id, since, owner_id)
+
+    async def collect(self, guild_id, cooldown, now, owner_id=None):
+        return await self.db.transaction(collect, guild_id, cooldown, now, owner_id)
+
+    async def reset_month(self, guild_id):
+        return await self.db.transaction(guild_stats.reset_monthly, guild_id)
+
+    async def guild_stats(self, guild_id):
+        return await self.db.read(guild_stats.fetch, guild_id)
+
+    async def all_guild_stats(self):
+        return await self.db.read(all_guild_stats)
+
+    async def leaderboard_rows(self, guild_id, window, metric, starts, page, page_size):
+        return await self.db.read(leaderboard.page_rows, guild_id, window, metric, starts, page, page_size)
+
+    async def get_schedule(self, name):
+        return await self.db.read(get_schedule, name)
+
+    async def save_schedule(self, name, next_run):
+        await self.db.transaction(save_schedule, name, next_run)
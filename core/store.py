@@ -0,0 +1,172 @@
+from abc import ABC, abstractmethod
+
+STORES = ("sqlite", "memory")
+
+DAY = 24 * 60 * 60
+
+
+class Store(ABC):
+    # Everything the bot keeps: tuppers, users, guild settings, guild stats,
+    # the XP ledger and the scheduler's next runs. Every method is a
+    # coroutine. SqliteStore (core/sqlite_store.py) keeps it in DB_PATH;
+    # MemoryStore (core/memory_store.py) keeps it in dicts and loses it on
+    # restart. RPXP_STORAGE picks one.
+
+    @abstractmethod
+    async def get_owner_tuppers(self, guild_id, owner_id):
+        """Returns the owner's OwnerTuppers (NO_TUPPERS when they have none)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def all_owner_tuppers(self):
+        """Returns {(guild_id, owner_id): OwnerTuppers} for every owner with tuppers."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_tupper(self, guild_id, owner_id, tag, name, role, level=None, parent=None):
+        """Adds a tupper; PCs and NPCs start with 0 rp xp, alters (role 2) hold none."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_tupper(self, guild_id, owner_id, name, alters=False):
+        """Deletes the owner's tupper called `name`, and with alters=True every alter parented to it."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_tupper_level(self, guild_id, owner_id, name, level):
+        """Sets the level of the owner's tupper called `name` and of its alters."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def has_user(self, guild_id, user_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def register_user(self, guild_id, user_id):
+        """Adds the user with empty counters; returns False when they were already registered."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def wipe_user(self, guild_id, user_id):
+        """Deletes the user's counters and XP ledger in the guild. Their tuppers stay."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_guild(self, guild_id):
+        """Returns the guild's GuildSettings, or None for an unregistered guild."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def all_guilds(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def register_guild(self, guild_id):
+        """Adds the guild with the default settings (guild_settings.defaults) unless it is already registered."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def update_guild(self, guild_id, **fields):
+        """Changes GuildSettings fields of a registered guild."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_guild(self, guild_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def apply_xp_batch(self, tuppers, users, last_message, events=()):
+        """Applies one XpBuffer batch (see XpBuffer.take) atomically and appends its events to the ledger."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def compact_xp_events(self, before):
+        """Folds ledger events older than `before` into daily snapshots; returns how many were folded."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def xp_window(self, guild_id, since, owner_id=None):
+        """Returns {(owner_id, tupper_name): (messages, words, xp)} earned since the UTC day `since` falls in."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def collect(self, guild_id, cooldown, now, owner_id=None):
+        """Collects for one owner, or everyone in the guild when owner_id is None.
+
+        Returns owner_id -> (cooldown_ready, any_rpxp_found,
+        latest_last_collection, collection_messages, total_collected).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def reset_month(self, guild_id):
+        """Zeroes the guild's monthly counters; returns its GuildStats from just before (None when it has no users)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def guild_stats(self, guild_id):
+        """Returns the guild's GuildStats, or None when it has no users."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def all_guild_stats(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def leaderboard_rows(self, guild_id, window, metric, starts, page, page_size):
+        """Returns page `page` of the guild's (value, user_id) rows, highest first (see core/leaderboard.py).
+
+        starts maps page numbers to the (value, user_id) key a page starts
+        after; stores that page by key fill in the pages they walk past.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_schedule(self, name):
+        """Returns the stored next run of a scheduler job, or None."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save_schedule(self, name, next_run):
+        raise NotImplementedError
+
+
+def open_store(kind, db=None):
+    """Returns the store named `kind` (RPXP_STORAGE, benchmarks/ingest.py --storage); db is the Database SqliteStore runs on."""
+    if kind == "sqlite":
+        from core.sqlite_store import SqliteStore
+        return SqliteStore(db)
+    if kind == "memory":
+        from core.memory_store import MemoryStore
+        return MemoryStore()
+    raise ValueError(f"Unknown storage {kind!r}, expected one of {', '.join(STORES)}")
+
+
+def collect_results(rows, ready):
+    # Shared by both stores. rows are (owner_id, tupper_name, tupper_role,
+    # tupper_rpxp, last_collection, monthly_rpxp, total_rpxp) for every
+    # non-alter tupper in owner order, ready the owners whose cooldown was
+    # just restarted. Returns the per-owner results and the (monthly, total)
+    # user XP of the owners that collect.
+    results = {}
+    users = {}
+    for owner, name, role, rpxp, last_collection, monthly, total in rows:
+        rpxp = round(rpxp or 0)
+        result = results.setdefault(owner, [owner in ready, False, 0, [], 0, 0])
+        result[2] = max(result[2], last_collection or 0)
+        if monthly is not None:
+            users[owner] = (monthly, total)
+
+        if rpxp > 0:
+            result[1] = True
+            result[4] += rpxp
+            if role == 1:
+                result[3].append(f"- **{name}** collects **{rpxp}** rp xp.")
+            else:
+                result[5] += rpxp
+
+    collected = {owner: users.get(owner) for owner, result in results.items() if result[0] and result[1]}
+    for result in results.values():
+        if result[5]:
+            result[3].append(f"- **{result[5]}** XP from your NPCs can be applied to a PC of your choice.")
+    return {owner: tuple(result[:5]) for owner, result in results.items()}, collected
@@ -0,0 +1,122 @@
+import re
+from typing import NamedTuple, Optional
+
+
+class Tupper(NamedTuple):
+    tag: str
+    name: str
+    role: int
+    level: Optional[int]
+    parent: Optional[str]
+
+
+class OwnerTuppers:
+    # All tuppers of one member in one guild, with a single precompiled
+    # matcher. Tags are tried longest first so "A::" wins over "A:".
+    def __init__(self, tuppers):
+        self.tuppers = tuppers
+        self.by_tag = {tupper.tag: tupper for tupper in tuppers}
+        self.by_name = {tupper.name: tupper for tupper in tuppers}
+
+        tags = sorted(self.by_tag, key=len, reverse=True)
+        if tags:
+            self.pattern = re.compile(r'(' + '|'.join(re.escape(tag) for tag in tags) + r')(.*)', re.DOTALL)
+        else:
+            self.pattern = None
+
+    def match(self, content):
+        """Returns (tupper, message body) for a tagged message, otherwise None."""
+        if self.pattern is None:
+            return None
+        match = self.pattern.match(content)
+        if not match:
+            return None
+        return self.by_tag[match.group(1)], match.group(2).lstrip()
+
+    def pc_levels(self):
+        return [tupper.level for tupper in self.tuppers if tupper.role == 1]
+
+    def xp_level(self, tupper):
+        # NPCs earn XP at the rounded average level of the owner's PCs
+        if tupper.role == 0:
+            levels = self.pc_levels()
+            return round(sum(levels) / len(levels))
+        return tupper.level
+
+
+NO_TUPPERS = OwnerTuppers([])
+
+
+class TupperCache:
+    # (guild_id, owner_id) -> OwnerTuppers. Members without tuppers are cached
+    # too, so ordinary chatter never reaches the database after the first
+    # message. Commands that change Tuppers must call invalidate().
+    #
+    # known_owners (an OwnerSet or OwnerBloom, once warm() has run) holds
+    # every member with at least one tupper, so messages from everyone else
+    # can be turned away before they are even queued.
+    #
+    # listeners are called as listener(guild_id, owner_id) after every
+    # invalidate(), for copies of the cache in other processes.
+    def __init__(self, store):
+        self.store = store
+        self._owners = {}
+        # Bumped by invalidate(), so a load that was in flight across an
+        # invalidation doesn't cache what it read before the change
+        self._generations = {}        # (guild_id, owner_id) -> count
+        self._guild_generations = {}  # guild_id -> count
+        self.known_owners = None
+        self.listeners = []
+
+    async def warm(self, owners):
+        """Loads every owner's tuppers in one scan and fills known_owners from them."""
+        loaded = await self.store.all_owner_tuppers()
+        for guild_id, owner_id in loaded:
+            owners.add(guild_id, owner_id)
+        self._owners.update(loaded)
+        self.known_owners = owners
+        return len(loaded)
+
+    def may_have_tuppers(self, guild_id, owner_id):
+        return self.known_owners is None or (guild_id, owner_id) in self.known_owners
+
+    async def get(self, guild_id, owner_id):
+        owner = self._owners.get((guild_id, owner_id))
+        if owner is None:
+            owner = await self.load(guild_id, owner_id)
+        return owner
+
+    def peek(self, guild_id, owner_id):
+        # Cached entry or None; never loads
+        return self._owners.get((guild_id, owner_id))
+
+    def _generation(self, guild_id, owner_id):
+        return self._generations.get((guild_id, owner_id), 0), self._guild_generations.get(guild_id, 0)
+
+    async def load(self, guild_id, owner_id):
+        generation = self._generation(guild_id, owner_id)
+        owner = await self.store.get_owner_tuppers(guild_id, owner_id)
+        if self._generation(guild_id, owner_id) != generation:
+            return owner  # Possibly stale; the next get() reads again
+        self._owners[(guild_id, owner_id)] = owner
+        if self.known_owners is not None and owner is NO_TUPPERS:
+            self.known_owners.discard(guild_id, owner_id)
+        return owner
+
+    def invalidate(self, guild_id, owner_id=None):
+        for listener in self.listeners:
+            listener(guild_id, owner_id)
+        if owner_id is not None:
+            self._generations[(guild_id, owner_id)] = self._generations.get((guild_id, owner_id), 0) + 1
+            self._owners.pop((guild_id, owner_id), None)
+            # Might have just registered a first tupper; load() takes the
+            # owner out again if not
+            if self.known_owners is not None:
+                self.known_owners.add(guild_id, owner_id)
+            return
+        self._guild_generations[guild_id] = self._guild_generations.get(guild_id, 0) + 1
+        for key in [key for key in self._owners if key[0] == guild_id]:
+            del self._owners[key]
+
+    def __len__(self):
+        return len(self._owners)
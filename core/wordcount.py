@@ -0,0 +1,77 @@
+import re
+from functools import lru_cache
+
+# Text a guild can choose not to count as roleplay words. Order matters:
+# earlier patterns win, so a URL inside a code block goes with the block.
+RULES = {
+    "code": r"```.*?(?:```|\Z)|`[^`\n]+`",
+    "quotes": r"^>>> .*\Z|^> [^\n]*",
+    "ooc": r"\(\(.*?(?:\)\)|\Z)",
+    "urls": r"(?:https?://|www\.)\S+",
+    "mentions": r"<(?:@[!&]?|#)\d+>|@everyone|@here",
+    "symbols": r"<a?:\w+:\d+>|(?<!\S)[^\w\s]+(?!\S)",
+}
+
+# Characters each rule's pattern can start with. With several rules these
+# are checked first, so ordinary words are skipped without trying every
+# alternative at every position. A single rule is left alone; the guard
+# measured slower there (see benchmarks/wordcount.py).
+LEADS = {
+    "code": r"`",
+    "quotes": r">",
+    "ooc": r"\(",
+    "urls": r"hw",
+    "mentions": r"<@",
+    "symbols": r"^\w\s",
+}
+
+
+def parse_rules(text):
+    """Parses a comma or space separated rule list ("none" or empty for plain counting)."""
+    names = {name.strip().lower() for name in re.split(r"[,\s]+", text or "") if name.strip()}
+    names.discard("none")
+    unknown = names - RULES.keys()
+    if unknown:
+        raise ValueError(f"Unknown word counting rule(s): {', '.join(sorted(unknown))}")
+    return frozenset(names)
+
+
+def format_rules(rules):
+    return ",".join(name for name in RULES if name in rules)
+
+
+def _plain(text):
+    # str.split runs in C and is still the fastest way to count words in
+    # CPython; see benchmarks/wordcount.py
+    return len(text.split())
+
+
+@lru_cache(maxsize=None)
+def counter_for(rules):
+    """Returns a function text -> word count for a frozenset of rule names."""
+    if not rules:
+        return _plain
+
+    # Every ignored construct is blanked out in a single regex pass, then
+    # the remaining words are counted
+    names = [name for name in RULES if name in rules]
+    leads = "|".join(f"[{LEADS[name]}]" for name in names)
+    patterns = "|".join(f"(?:{RULES[name]})" for name in names)
+    if len(names) > 1:
+        patterns = f"(?=(?:{leads}))(?:{patterns})"
+    skip = re.compile(patterns, re.DOTALL | re.MULTILINE)
+
+    def count(text):
+        return len(skip.sub(" ", text).split())
+
+    return count
+
+
+@lru_cache(maxsize=None)
+def counter_for_setting(setting):
+    """Same as counter_for, from a stored Guilds.word_rules value."""
+    return counter_for(parse_rules(setting))
+
+
+def count_words(text, rules=frozenset()):
+    return counter_for(rules)(text)
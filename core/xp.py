@@ -0,0 +1,53 @@
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the batch API
+    np = None
+
+LEVEL_MULTS = (
+    1.0,           # Level 1 → 2
+    2.0,           # Level 2 → 3
+    6.0,           # Level 3 → 4
+    12.66,         # Level 4 → 5
+    24.922,        # Level 5 → 6
+    29.9064,       # Level 6 → 7
+    36.4938,       # Level 7 → 8
+    46.3031,       # Level 8 → 9
+    52.7855,       # Level 9 → 10
+    69.148,        # Level 10 → 11
+    49.0941,       # Level 11 → 12
+    65.2891,       # Level 12 → 13
+    65.2891,       # Level 13 → 14
+    81.6114,       # Level 14 → 15
+    97.9337,       # Level 15 → 16
+    97.9337,       # Level 16 → 17
+    130.2558,      # Level 17 → 18
+    130.2558,      # Level 18 → 19
+    162.8197       # Level 19 → 20
+)
+
+
+@lru_cache(maxsize=256)
+def rate_table(xppw, falloff):
+    """XP per word for every level, indexed by level - 1."""
+    return tuple(
+        (xppw * mult / 6) * ((100 - falloff * (level - 3)) / 100)
+        for level, mult in enumerate(LEVEL_MULTS, start=1)
+    )
+
+
+def xp_for_words(word_count, level, xppw, falloff):
+    return word_count * rate_table(xppw, falloff)[level - 1]
+
+
+def batch_xp(word_counts, levels, xppw, falloff):
+    """XP for parallel sequences of word counts and levels.
+
+    Uses numpy when it is installed and returns an array; otherwise falls
+    back to a plain list.
+    """
+    table = rate_table(xppw, falloff)
+    if np is not None:
+        return np.asarray(word_counts, dtype=np.float64) * np.asarray(table)[np.asarray(levels, dtype=np.intp) - 1]
+    return [words * table[level - 1] for words, level in zip(word_counts, levels)]
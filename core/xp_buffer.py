@@ -0,0 +1,92 @@
+import asyncio
+
+
+class XpBuffer:
+    # Write-behind store for per-message XP. Deltas are summed in memory and
+    # written in one transaction by flush(); anything that reads tupper_rpxp
+    # or the Users counters must flush first.
+    def __init__(self, store, threshold=200):
+        self.store = store
+        self.threshold = threshold
+        self.flushes = 0
+        self.flushed_messages = 0
+        self._lock = asyncio.Lock()
+        self._writing = None
+        self._reset()
+
+    def _reset(self):
+        self._tuppers = {}        # (guild_id, owner_id, tupper_name) -> xp
+        self._users = {}          # (guild_id, user_id) -> [words, xp]
+        self._last_message = {}   # (guild_id, owner_id, tupper_name, include_alters) -> timestamp
+        self._events = []         # XpEvents rows, one per message
+        self._messages = 0
+
+    @property
+    def pending(self):
+        return self._messages
+
+    def should_flush(self):
+        return self._messages >= self.threshold
+
+    def add(self, guild_id, owner_id, target, include_alters, words, xp, now):
+        tupper_key = (guild_id, owner_id, target)
+        self._tuppers[tupper_key] = self._tuppers.get(tupper_key, 0) + xp
+
+        user = self._users.setdefault((guild_id, owner_id), [0, 0])
+        user[0] += words
+        user[1] += xp
+
+        self._last_message[(guild_id, owner_id, target, include_alters)] = now
+        self._messages += 1
+
+    def event(self, message_id, guild_id, owner_id, target, words, xp, timestamp):
+        # The ledger entry for one message; add() carries the totals
+        self._events.append((message_id, guild_id, owner_id, target, words, xp, timestamp))
+
+    async def flush(self):
+        async with self._lock:
+            if self._writing is not None:
+                # Left running by a flush that was cancelled
+                await asyncio.wait([self._writing])
+            if not self._messages:
+                return 0
+
+            # Shielded: cancelling the flush must not cancel a write that may
+            # already be on the writer thread, or the batch would be lost
+            self._writing = asyncio.ensure_future(self._write(self.take()))
+            # A failed write restores its batch; if nobody is left waiting on
+            # it, the next flush retries without the error being reported twice
+            self._writing.add_done_callback(lambda task: task.cancelled() or task.exception())
+            return await asyncio.shield(self._writing)
+
+    async def _write(self, batch):
+        try:
+            await self.store.apply_xp_batch(*batch[:4])
+        except Exception:
+            self.restore(*batch)
+            raise
+        finally:
+            self._writing = None
+
+        self.flushes += 1
+        self.flushed_messages += batch[4]
+        return batch[4]
+
+    def take(self):
+        """Returns (tuppers, users, last_message, events, messages) and starts an empty batch."""
+        batch = self._tuppers, self._users, self._last_message, self._events, self._messages
+        self._reset()
+        return batch
+
+    def restore(self, tuppers, users, last_message, events, messages):
+        # Put a failed batch back so the next flush retries it.
+        for key, xp in tuppers.items():
+            self._tuppers[key] = self._tuppers.get(key, 0) + xp
+        for key, (words, xp) in users.items():
+            user = self._users.setdefault(key, [0, 0])
+            user[0] += words
+            user[1] += xp
+        for key, now in last_message.items():
+            self._last_message[key] = max(now, self._last_message.get(key, now))
+        self._events[:0] = events
+        self._messages += messages
@@ -0,0 +1,60 @@
+import random
+
+import pytest
+
+from core import xp
+from core.tupper_cache import OwnerTuppers, Tupper
+from tools import backfill
+
+
+def _history(rng, count):
+    tags = ["M:", "C:", "N:", "X:"]
+    for index in range(count):
+        words = " ".join(["word"] * rng.randint(1, 40))
+        yield rng.choice([1, 2]), rng.choice([10, 11]), f"{rng.choice(tags)} {words}", float(index)
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_chunked_matches_xp_for_words(monkeypatch, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(xp, "np", None)
+    owners = {
+        (guild_id, owner_id): OwnerTuppers([
+            Tupper("M:", "Melanie", 1, 3 + owner_id % 5, None),
+            Tupper("C:", "Coach", 1, 12, None),
+            Tupper("N:", "Nurse", 0, None, None),
+        ])
+        for guild_id in (1, 2) for owner_id in (10, 11)
+    }
+    settings = {1: (0.02, 5, lambda body: len(body.split())), 2: (0.05, 0, lambda body: len(body.split()))}
+    history = list(_history(random.Random(7), 500))
+
+    stats = {"messages": 0, "matched": 0, "unscorable": 0}
+    tuppers, users, _ = {}, {}, {}
+    for batch_tuppers, batch_users, earlier_users in backfill.chunked(backfill.score(iter(history), owners, settings, stats, 0), settings, 64):
+        assert not earlier_users
+        backfill.merge(tuppers, batch_tuppers)
+        backfill.merge(users, batch_users)
+
+    expected_tuppers, expected_users = {}, {}
+    for guild_id, owner_id, content, _ in history:
+        found = owners[(guild_id, owner_id)].match(content)
+        if found is None:
+            continue
+        tupper, body = found
+        xppw, falloff, count_words = settings[guild_id]
+        words = count_words(body)
+        gained = xp.xp_for_words(words, owners[(guild_id, owner_id)].xp_level(tupper), xppw, falloff)
+        key = (guild_id, owner_id, tupper.name)
+        expected_tuppers[key] = expected_tuppers.get(key, 0) + gained
+        user = expected_users.setdefault((guild_id, owner_id), [0, 0])
+        user[0] += words
+        user[1] += gained
+
+    assert stats["matched"] == sum(1 for *_, content, _ in history if not content.startswith("X:"))
+    assert tuppers.keys() == expected_tuppers.keys()
+    for key, value in expected_tuppers.items():
+        assert tuppers[key] == pytest.approx(value)
+    for key, (words, gained) in expected_users.items():
+        assert users[key][0] == words
+        assert users[key][1] == pytest.approx(gained)
@@ -0,0 +1,46 @@
+import random
+import sqlite3
+
+from core import guild_stats, sqlite_store
+from core.migrations import migrate
+
+
+def _connect():
+    connection = sqlite3.connect(":memory:")
+    migrate(connection.cursor())
+    return connection
+
+
+def _stats(connection):
+    return connection.execute(f"SELECT {guild_stats.COLUMNS} FROM GuildStats ORDER BY guild_id").fetchall()
+
+
+def test_tied_increments_match_refresh():
+    connection = _connect()
+    cursor = connection.cursor()
+    # Three users reach the same word counts in different orders; the
+    # highest user_id must hold first place, as refresh() decides it
+    for user_id, words in [(20, 50), (10, 50), (30, 20), (30, 30), (10, 10), (20, 10)]:
+        sqlite_store.apply_xp_batch(cursor, {}, {(1, user_id): (words, 1.0)}, {})
+        incremental = _stats(connection)
+        guild_stats.refresh(cursor)
+        assert incremental == _stats(connection)
+
+    row = guild_stats.fetch(cursor, 1)
+    assert (row.monthly_top_user, row.monthly_top_words) == (20, 60)
+    assert (row.total_top_user, row.total_top_words) == (20, 60)
+
+
+def test_random_batches_match_refresh():
+    connection = _connect()
+    cursor = connection.cursor()
+    rng = random.Random(14)
+    for _ in range(200):
+        users = {}
+        for _ in range(rng.randint(1, 4)):
+            # Few distinct word counts, so ties are common
+            users[(rng.randint(1, 2), rng.randint(1, 8))] = (rng.choice([0, 5, 10]), 0.5)
+        sqlite_store.apply_xp_batch(cursor, {}, users, {})
+        incremental = _stats(connection)
+        guild_stats.refresh(cursor)
+        assert incremental == _stats(connection)
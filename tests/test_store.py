@@ -0,0 +1,95 @@
+import asyncio
+
+from core.database import Database
+from core.memory_store import MemoryStore
+from core.migrations import migrate
+from core.sqlite_store import SqliteStore
+
+DAY = 24 * 60 * 60
+
+
+def _tuppers(owner):
+    return [tuple(tupper) for tupper in owner.tuppers]
+
+
+async def _scenario(store):
+    # The same operations the commands, the XP buffer and the scheduler run,
+    # recording everything that can be read back
+    seen = []
+
+    await store.register_guild(1)
+    await store.update_guild(1, staff_role=5, rpxp_channel=6, cooldown=0)
+    await store.register_guild(1)
+    await store.register_guild(2)
+    await store.update_guild(2, xppw=0.05, word_rules="ooc")
+    seen.append(await store.get_guild(1))
+    seen.append(sorted(await store.all_guilds()))
+
+    seen.append(await store.register_user(1, 10))
+    seen.append(await store.register_user(1, 10))
+    seen.append(await store.register_user(1, 11))
+    seen.append([await store.has_user(1, user_id) for user_id in (10, 11, 12)])
+
+    await store.create_tupper(1, 10, "A:", "Anna", 1, 3)
+    await store.create_tupper(1, 10, "N:", "Ned", 0)
+    await store.create_tupper(1, 10, "AA:", "Annie", 2, 3, "Anna")
+    await store.create_tupper(1, 11, "B:", "Bob", 1, 5)
+    await store.create_tupper(1, 12, "C:", "Cleo", 1, 7)
+    await store.set_tupper_level(1, 10, "Anna", 4)
+    seen.append(_tuppers(await store.get_owner_tuppers(1, 10)))
+
+    await store.apply_xp_batch(
+        {(1, 10, "Anna"): 12.5, (1, 10, "Ned"): 3.0, (1, 11, "Bob"): 7.0},
+        {(1, 10): (100, 15.5), (1, 11): (50, 7.0), (1, 12): (100, 1.5)},
+        {(1, 10, "Anna", True): 1000.0},
+        [(1, 1, 10, "Anna", 80, 12.5, 1000), (2, 1, 10, "Ned", 20, 3.0, 1000), (3, 1, 11, "Bob", 50, 7.0, DAY + 5)],
+    )
+    seen.append(await store.guild_stats(1))
+    for window in ("monthly", "total"):
+        for metric in ("words", "xp"):
+            starts = {1: None}
+            seen.append([await store.leaderboard_rows(1, window, metric, starts, page, 2) for page in (2, 1, 3)])
+
+    seen.append(await store.collect(1, 0, 2000, 10))
+    seen.append(await store.collect(1, 0, 3000))
+    seen.append(await store.xp_window(1, 0))
+    seen.append(await store.compact_xp_events(DAY))
+    seen.append(await store.xp_window(1, 0))
+    seen.append(await store.xp_window(1, DAY, 11))
+
+    await store.delete_tupper(1, 10, "Ned")
+    seen.append(_tuppers(await store.get_owner_tuppers(1, 10)))
+    await store.delete_tupper(1, 10, "Anna", alters=True)
+    seen.append(_tuppers(await store.get_owner_tuppers(1, 10)))
+    seen.append({key: _tuppers(owner) for key, owner in (await store.all_owner_tuppers()).items()})
+
+    await store.wipe_user(1, 11)
+    seen.append(await store.has_user(1, 11))
+    seen.append(await store.guild_stats(1))
+    seen.append(await store.xp_window(1, 0))
+
+    seen.append(await store.reset_month(1))
+    seen.append(sorted(await store.all_guild_stats()))
+
+    await store.delete_guild(2)
+    seen.append(await store.get_guild(2))
+
+    seen.append(await store.get_schedule("monthly_stats"))
+    await store.save_schedule("monthly_stats", 10.0)
+    await store.save_schedule("monthly_stats", 20.0)
+    seen.append(await store.get_schedule("monthly_stats"))
+    return seen
+
+
+async def _sqlite(path):
+    db = Database(path)
+    try:
+        await db.transaction(migrate)
+        return await _scenario(SqliteStore(db))
+    finally:
+        db.close()
+
+
+def test_memory_store_matches_sqlite_store(tmp_path):
+    expected = asyncio.run(_sqlite(str(tmp_path / "rpxp.db")))
+    assert asyncio.run(_scenario(MemoryStore())) == expected
@@ -0,0 +1,207 @@
+"""Recompute RP XP from an exported channel history.
+
+    python -m tools.backfill history.jsonl [--dry-run] [--mode add|totals]
+
+The export is JSONL with one message per line:
+    {"guild": 123, "author": 456, "content": "M: Hello", "timestamp": 1751371754}
+
+Messages go through the same tag matching and XP formula as the live
+bot. XP from messages sent before the current month (UTC) only counts
+toward all-time totals; messages without a timestamp count as older.
+Only per-tupper and per-user sums are kept in memory, so memory use
+depends on the number of characters, not on the length of the history.
+"""
+import argparse
+import datetime
+import itertools
+import json
+import sqlite3
+import sys
+from datetime import timezone
+
+from core import config, guild_stats, sqlite_store
+from core.migrations import migrate
+from core.wordcount import counter_for_setting
+from core.xp import LEVEL_MULTS, batch_xp
+
+
+def read_history(path):
+    handle = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for line_no, line in enumerate(handle, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                yield int(record["guild"]), int(record["author"]), record["content"], float(record.get("timestamp") or 0)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"Skipping line {line_no}: {e}", file=sys.stderr)
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def load_owners(connection):
+    return sqlite_store.all_owner_tuppers(connection.cursor())
+
+
+def load_settings(connection, xppw=None, falloff=None):
+    return {
+        guild_id: (guild_xppw if xppw is None else xppw, guild_falloff if falloff is None else falloff, counter_for_setting(word_rules))
+        for guild_id, guild_xppw, guild_falloff, word_rules in connection.execute("SELECT guild_id, xppw, level_falloff, word_rules FROM Guilds")
+    }
+
+
+def month_start():
+    return datetime.datetime.now(timezone.utc).replace(day=1, hour=0, minute=0, second=0, microsecond=0).timestamp()
+
+
+def score(messages, owners, settings, stats, since):
+    """Yields (guild_id, owner_id, target tupper, words, xp level, this month) for every RP message; this month means sent at or after `since`."""
+    for guild_id, author_id, content, timestamp in messages:
+        stats["messages"] += 1
+        owner = owners.get((guild_id, author_id))
+        guild = settings.get(guild_id)
+        if owner is None or guild is None:
+            continue
+        found = owner.match(content)
+        if found is None:
+            continue
+
+        tupper, message_body = found
+        try:
+            level = owner.xp_level(tupper)
+        except ZeroDivisionError:  # NPC of an owner without PCs
+            level = None
+        if not isinstance(level, int) or not 1 <= level <= len(LEVEL_MULTS):
+            stats["unscorable"] += 1
+            continue
+
+        stats["matched"] += 1
+        yield guild_id, author_id, tupper.parent or tupper.name, guild[2](message_body), level, timestamp >= since
+
+
+def chunked(deltas, settings, size):
+    """Scores deltas and sums them into (tuppers, users this month, users before) batches of at most `size` messages."""
+    while True:
+        guilds = {}  # guild_id -> rows of that guild's messages in this chunk
+        for delta in itertools.islice(deltas, size):
+            guilds.setdefault(delta[0], []).append(delta)
+        if not guilds:
+            return
+
+        tuppers, users, earlier_users = {}, {}, {}
+        for guild_id, rows in guilds.items():
+            # One vectorised XP calculation per guild and chunk
+            guild_xppw, guild_falloff, _ = settings[guild_id]
+            xps = batch_xp([row[3] for row in rows], [row[4] for row in rows], guild_xppw, guild_falloff)
+            for (_, owner_id, target, words, _, this_month), xp in zip(rows, xps):
+                xp = float(xp)
+                tuppers[(guild_id, owner_id, target)] = tuppers.get((guild_id, owner_id, target), 0) + xp
+                user = (users if this_month else earlier_users).setdefault((guild_id, owner_id), [0, 0])
+                user[0] += words
+                user[1] += xp
+        yield tuppers, users, earlier_users
+
+
+def merge(into, batch):
+    for key, value in batch.items():
+        if isinstance(value, list):
+            current = into.setdefault(key, [0, 0])
+            current[0] += value[0]
+            current[1] += value[1]
+        else:
+            into[key] = into.get(key, 0) + value
+
+
+def print_diff(connection, tuppers, users, mode):
+    if mode == "add":
+        for (guild_id, owner_id, name), xp in sorted(tuppers.items()):
+            row = connection.execute(
+                "SELECT tupper_rpxp FROM Tuppers WHERE guild_id = ? AND owner_id = ? AND tupper_name = ?",
+                (guild_id, owner_id, name)
+            ).fetchone()
+            current = (row[0] or 0) if row else 0
+            print(f"Tupper {guild_id}/{owner_id} {name}: rpxp {current:.2f} -> {current + xp:.2f} (+{xp:.2f})")
+
+    for (guild_id, user_id), (words, xp) in sorted(users.items()):
+        row = connection.execute(
+            "SELECT total_messages, total_rpxp FROM Users WHERE guild_id = ? AND user_id = ?",
+            (guild_id, user_id)
+        ).fetchone()
+        current_words, current_xp = row if row else (0, 0)
+        new_words, new_xp = (current_words + words, current_xp + xp) if mode == "add" else (words, xp)
+        print(f"User {guild_id}/{user_id}: words {current_words} -> {new_words}, rpxp {current_xp:.2f} -> {new_xp:.2f}")
+
+
+def write_totals(connection, users, size):
+    rows = [(words, xp, guild_id, user_id) for (guild_id, user_id), (words, xp) in users.items()]
+    for start in range(0, len(rows), size):
+        with connection:
+            connection.executemany(
+                "INSERT OR IGNORE INTO Users (guild_id, user_id, monthly_messages, monthly_rpxp, total_messages, total_rpxp) VALUES (?, ?, 0, 0, 0, 0)",
+                [(guild_id, user_id) for _, _, guild_id, user_id in rows[start:start + size]]
+            )
+            connection.executemany(
+                "UPDATE Users SET total_messages = ?, total_rpxp = ? WHERE guild_id = ? AND user_id = ?",
+                rows[start:start + size]
+            )
+            # Totals can go down here, so rebuild the aggregates outright
+            cursor = connection.cursor()
+            for guild_id in {guild_id for _, _, guild_id, _ in rows[start:start + size]}:
+                guild_stats.refresh(cursor, guild_id)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute RP XP from an exported message history.")
+    parser.add_argument("history", help="JSONL export, or - for stdin")
+    parser.add_argument("--db", default=config.DB_PATH, help="database to update")
+    parser.add_argument("--mode", choices=["add", "totals"], default="add",
+                        help="add: credit XP to tuppers and users like live messages (monthly figures only for this month's); "
+                             "totals: overwrite users' all-time words and rpxp with the recomputed values")
+    parser.add_argument("--dry-run", action="store_true", help="print the changes instead of writing them")
+    parser.add_argument("--chunk-size", type=int, default=5000, help="messages per transaction")
+    parser.add_argument("--xppw", type=float, help="override xp per word for every guild")
+    parser.add_argument("--falloff", type=int, help="override level falloff for every guild")
+    args = parser.parse_args(argv)
+
+    connection = sqlite3.connect(args.db)
+    connection.execute("PRAGMA busy_timeout = 5000")
+    migrate(connection.cursor())
+
+    owners = load_owners(connection)
+    settings = load_settings(connection, args.xppw, args.falloff)
+    stats = {"messages": 0, "matched": 0, "unscorable": 0, "chunks": 0}
+
+    deltas = score(read_history(args.history), owners, settings, stats, month_start())
+    all_tuppers, all_users = {}, {}
+
+    for tuppers, users, earlier_users in chunked(deltas, settings, args.chunk_size):
+        stats["chunks"] += 1
+        if args.mode == "add" and not args.dry_run:
+            # Only this month's messages go into the monthly figures
+            with connection:
+                sqlite_store.apply_xp_batch(connection.cursor(), tuppers, users, {})
+                sqlite_store.apply_xp_batch(connection.cursor(), {}, earlier_users, {}, monthly=False)
+        else:
+            if args.mode == "add":
+                merge(all_tuppers, tuppers)
+            merge(all_users, users)
+            merge(all_users, earlier_users)
+
+    if args.dry_run:
+        print_diff(connection, all_tuppers, all_users, args.mode)
+    elif args.mode == "totals":
+        write_totals(connection, all_users, args.chunk_size)
+
+    connection.close()
+    print(
+        f"{stats['messages']} messages read, {stats['matched']} matched a tupper, "
+        f"{stats['unscorable']} could not be scored, {stats['chunks']} chunks"
+        + (" (dry run, nothing written)" if args.dry_run else "")
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Take, list and restore database backups.
+
+    python -m tools.backup now
+    python -m tools.backup list
+    python -m tools.backup restore rpxp-20250701-120000.db.gz
+
+The bot takes the same backups on its own every RPXP_BACKUP_INTERVAL
+seconds. Stop the bot before restoring: the current database is backed up
+first and then overwritten with the snapshot.
+"""
+import argparse
+import os
+import sys
+import time
+
+from core import config
+from core.backup import restore, snapshots, write_snapshot
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Take, list and restore database backups.")
+    parser.add_argument("action", choices=["now", "list", "restore"])
+    parser.add_argument("snapshot", nargs="?", help="backup to restore, a path or a file name in --dir")
+    parser.add_argument("--db", default=config.DB_PATH, help="database to back up or restore into")
+    parser.add_argument("--dir", default=config.BACKUP_DIR, help="backup directory")
+    parser.add_argument("--keep", type=int, default=config.BACKUP_KEEP, help="backups to keep")
+    args = parser.parse_args(argv)
+
+    if args.action == "list":
+        for path in snapshots(args.dir):
+            print(f"{os.path.basename(path)}  {os.path.getsize(path) / 1024:.0f} KiB")
+        return
+
+    if args.action == "now":
+        started = time.perf_counter()
+        path, raw_size, size, _ = write_snapshot(args.db, args.dir, args.keep, config.BACKUP_PAGES, config.BACKUP_STEP_PAUSE)
+        print(f"Backed up {raw_size / 1024:.0f} KiB to {path} ({size / 1024:.0f} KiB) in {time.perf_counter() - started:.2f} s")
+        return
+
+    if args.snapshot is None:
+        parser.error("restore needs a snapshot")
+    snapshot = args.snapshot if os.path.exists(args.snapshot) else os.path.join(args.dir, args.snapshot)
+    if not os.path.exists(snapshot):
+        sys.exit(f"No such backup: {args.snapshot}")
+    if os.path.exists(args.db):
+        # Keep every existing backup, so the one being restored can't be rotated out
+        path, _, _, _ = write_snapshot(args.db, args.dir, len(snapshots(args.dir)) + 1)
+        print(f"Backed up the current database to {path}")
+    restore(snapshot, args.db)
+    print(f"Restored {args.db} from {snapshot}")
+
+
+if __name__ == "__main__":
+    main()